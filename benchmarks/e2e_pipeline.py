@@ -0,0 +1,190 @@
+"""
+端到端流水线基准测试
+
+在子进程中启动本地替身服务（合成 RSS、Telegram Bot API、Telegraph，见 stand_ins.py），
+然后在本进程中运行真实的 bot 代码：scheduled_task → parse_feed → 投递队列 →
+publish_rss_item → send_photo。运行结束后汇总吞吐量、投递延迟（条目发布到 Bot API
+收到发送请求）、事件循环延迟和峰值内存，并写入 JSON 以便比较不同版本。
+
+需要可写的 MySQL 数据库（使用 MYSQL_HOST / MYSQL_USER / MYSQL_PASS），库名由 --database 指定。
+每次运行前会停用该库中以 @bench_ 开头的订阅，不要指向生产数据库。
+
+用法:
+    python benchmarks/e2e_pipeline.py --database rss_bench --feeds 50 --duration 60 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+
+from benchmarks.parse_latency import probe
+from benchmarks.stand_ins import StandInOptions, serve, channel_id, channel_name
+from kernel.config import telegram_config, telegraph_config, db_config, scheduler_config
+from kernel.db_manager import get_db
+from kernel.feed_parser import parse_feed
+from kernel.normalizer import normalize_items
+from kernel.seen_index import get_seen_index
+from business import telegram_bot
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def summarize(stats: dict, started: float, finished: float, lags: list) -> dict:
+    """
+    根据替身服务记录的发布和发送情况计算结果
+    """
+    published = {marker: at for marker, at in stats['published'].items() if started <= at <= finished}
+    latencies = []
+    delivered = set()
+    duplicates = 0
+    for delivery in stats['deliveries']:
+        marker = delivery['marker']
+        if marker in delivered:
+            duplicates += 1
+            continue
+        delivered.add(marker)
+        if marker in published and delivery['received_at'] <= finished:
+            latencies.append(delivery['received_at'] - published[marker])
+    elapsed = finished - started
+    return {
+        'elapsed_s': elapsed,
+        'published': len(published),
+        'delivered': len(latencies),
+        'duplicates': duplicates,
+        'items_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+        'latency_p50_ms': percentile(latencies, 0.5) * 1000,
+        'latency_p99_ms': percentile(latencies, 0.99) * 1000,
+        'latency_max_ms': max(latencies, default=0.0) * 1000,
+        'loop_lag_p50_ms': percentile(lags, 0.5) * 1000,
+        'loop_lag_p99_ms': percentile(lags, 0.99) * 1000,
+        'loop_lag_max_ms': max(lags, default=0.0) * 1000,
+        # Linux 下 ru_maxrss 的单位为 KiB
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'counters': stats['counters'],
+    }
+
+
+async def run(args) -> dict:
+    options = StandInOptions(
+        feeds=args.feeds,
+        items=args.items,
+        description_bytes=args.description_bytes,
+        update_interval=args.update_interval,
+        api_latency=args.api_latency / 1000,
+        retry_after_ratio=args.retry_after_ratio,
+        retry_after=args.retry_after,
+    )
+    context = multiprocessing.get_context('spawn')
+    port_queue = context.Queue()
+    server = context.Process(target=serve, args=(options, port_queue), daemon=True)
+    server.start()
+    base = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+
+    # 指向替身服务，轮询间隔固定为 --poll-interval
+    telegram_config['base_url'] = f"{base}/bot"
+    telegram_config['base_file_url'] = f"{base}/file/bot"
+    telegraph_config['api_url'] = f"{base}/telegraph"
+    telegraph_config['access_token'] = 'bench-token'
+    db_config['database'] = args.database
+    scheduler_config.update(mode='local', startup_delay=0, interval=args.poll_interval,
+                            min_interval=args.poll_interval, max_interval=args.poll_interval,
+                            jitter=0, tick=1)
+
+    applications = []
+    try:
+        await telegram_bot.init_task()
+        db = get_db()
+        for subscription in await db.get_subscriptions():
+            if subscription['channel_name'].startswith('@bench_'):
+                await db.remove_subscription(subscription['channel_id'], subscription['feed_url'])
+        for feed in range(args.feeds):
+            await db.add_subscription(channel_id(feed), channel_name(feed), f"{base}/rss/{feed}")
+        for i in range(args.bots):
+            applications.append(await telegram_bot.run(f"{900001 + i}:BENCH", worker=True))
+        # 新订阅没有 watermark 和已处理记录，初始条目会在第一次轮询时全部推送；
+        # 测量前把它们标记为已处理，结果只反映运行期间新发布的条目
+        seen_index = get_seen_index()
+        for subscription in await db.get_subscriptions():
+            if subscription['channel_name'].startswith('@bench_'):
+                items = normalize_items(await parse_feed(subscription['feed_url']))
+                await seen_index.mark_seen(subscription['id'], [item.item_id for item in items])
+
+        lags = []
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(lags, stop))
+        started = time.time()
+        scheduler = asyncio.create_task(telegram_bot.scheduled_task())
+        await asyncio.sleep(args.duration)
+        finished = time.time()
+        scheduler.cancel()
+        stop.set()
+        await probe_task
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{base}/stats") as response:
+                stats = await response.json()
+        return summarize(stats, started, finished, lags)
+    finally:
+        for application in applications:
+            await application.stop()
+            await application.shutdown()
+        await telegram_bot.shutdown()
+        server.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', required=True, help='基准测试使用的 MySQL 数据库')
+    parser.add_argument('--feeds', type=int, default=50, help='feed 数量（每个 feed 一个频道）')
+    parser.add_argument('--items', type=int, default=20, help='每个 feed 保留的条目数量')
+    parser.add_argument('--description-bytes', type=int, default=2048, help='每个条目描述的大小')
+    parser.add_argument('--update-interval', type=float, default=10, help='每个 feed 发布新条目的间隔（秒）')
+    parser.add_argument('--poll-interval', type=int, default=5, help='轮询间隔（秒）')
+    parser.add_argument('--bots', type=int, default=2, help='bot 数量')
+    parser.add_argument('--api-latency', type=float, default=50, help='Bot API 每次请求的延迟（毫秒）')
+    parser.add_argument('--retry-after-ratio', type=float, default=0.01, help='返回 429 的发送请求比例')
+    parser.add_argument('--retry-after', type=int, default=1, help='429 响应中的 retry_after（秒）')
+    parser.add_argument('--duration', type=float, default=60, help='测量时长（秒）')
+    parser.add_argument('--output', help='结果 JSON 文件路径')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'options': {key: value for key, value in vars(args).items() if key not in ('database', 'output')},
+        'results': results,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+feed 解析对事件循环延迟的影响
+
+并发解析若干个大型 feed，同时用一个探测协程测量事件循环的调度延迟，
+分别在直接解析（PARSE_WORKERS=0）和进程池解析两种模式下运行。
+
+用法:
+    python benchmarks/parse_latency.py --feeds 8 --items 2000 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kernel.config import parse_config
+from kernel import feed_parser
+
+PROBE_INTERVAL = 0.005
+
+
+def build_feed(items: int) -> bytes:
+    """
+    生成一个包含指定条目数量的 RSS 文档
+    """
+    entries = []
+    for i in range(items):
+        entries.append(
+            f"<item><title>Item {i} 标题</title>"
+            f"<link>https://example.com/{i}</link>"
+            f"<guid>https://example.com/{i}</guid>"
+            f"<pubDate>Sun, 16 Mar 2025 00:{i % 60:02d}:09 GMT</pubDate>"
+            f"<description><![CDATA[<p>{'text ' * 40}</p>"
+            f"<img src=\"https://example.com/{i}.jpg\" /></p>]]></description></item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+        '<title>bench</title>' + ''.join(entries) + '</channel></rss>'
+    ).encode('utf-8')
+
+
+async def probe(lags: list, stop: asyncio.Event):
+    """
+    周期性休眠，记录实际唤醒时间与期望时间的差值
+    """
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def run(content: bytes, feeds: int) -> dict:
+    lags = []
+    stop = asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(feed_parser.parse_content(content) for _ in range(feeds)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe_task
+    lags.sort()
+    return {
+        'items': sum(len(items) for items in results),
+        'elapsed': elapsed,
+        'lag_p50_ms': lags[len(lags) // 2] * 1000 if lags else 0,
+        'lag_p99_ms': lags[int(len(lags) * 0.99)] * 1000 if lags else 0,
+        'lag_max_ms': lags[-1] * 1000 if lags else 0,
+    }
+
+
+def report(name: str, result: dict):
+    print(f"{name:<10} items={result['items']:<7} elapsed={result['elapsed']:.2f}s "
+          f"lag p50={result['lag_p50_ms']:.1f}ms p99={result['lag_p99_ms']:.1f}ms "
+          f"max={result['lag_max_ms']:.1f}ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--feeds', type=int, default=8, help='并发解析的 feed 数量')
+    parser.add_argument('--items', type=int, default=2000, help='每个 feed 的条目数量')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='解析进程数')
+    args = parser.parse_args()
+
+    content = build_feed(args.items)
+    print(f"feed size: {len(content) / 1024:.0f} KiB x {args.feeds}")
+
+    parse_config['workers'] = 0
+    report('inline', await run(content, args.feeds))
+
+    parse_config['workers'] = args.workers
+    parse_config['inline_max_bytes'] = 0
+    # 预热进程池，排除进程启动时间
+    warmup = build_feed(1)
+    await asyncio.gather(*(feed_parser.parse_content(warmup) for _ in range(args.workers)))
+    report('pool', await run(content, args.feeds))
+    feed_parser.close_parse_executor()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,223 @@
+"""
+端到端基准测试使用的本地替身服务
+
+一个 aiohttp 应用同时提供:
+    /rss/<n>                 合成的 RSS feed，按固定间隔追加新条目，支持 ETag
+    /bot<token>/<method>     Telegram Bot API，可配置延迟和 429 注入
+    /telegraph/<method>      Telegraph API
+    /stats                   已发布条目和已收到的发送请求，供基准测试汇总
+
+服务在独立进程中运行，不占用被测进程的事件循环和内存。
+"""
+import asyncio
+import hashlib
+import itertools
+import random
+import time
+from email.utils import formatdate
+from typing import Dict, List, NamedTuple
+
+from aiohttp import web
+
+# 条目标题中的标记，用于把收到的发送请求对应回条目
+MARKER_FORMAT = "F{feed}-I{item}"
+
+
+class StandInOptions(NamedTuple):
+    feeds: int
+    items: int
+    description_bytes: int
+    update_interval: float
+    api_latency: float
+    retry_after_ratio: float
+    retry_after: int
+
+
+def channel_id(feed: int) -> int:
+    """
+    第 feed 个测试频道的 chat id
+    """
+    return -1000000000000 - feed
+
+
+def channel_name(feed: int) -> str:
+    return f"@bench_{feed}"
+
+
+class StandIns:
+    def __init__(self, options: StandInOptions):
+        self.options = options
+        self.feeds: List[List[dict]] = [[] for _ in range(options.feeds)]
+        self.published: Dict[str, float] = {}
+        self.deliveries: List[dict] = []
+        self.counters = {'rss_requests': 0, 'rss_not_modified': 0, 'bot_requests': 0,
+                         'retry_after': 0, 'telegraph_pages': 0, 'photo_fetches': 0, 'photo_file_ids': 0}
+        self._message_ids = itertools.count(1)
+        self._page_ids = itertools.count(1)
+        self._rendered: Dict[int, tuple] = {}
+        # 初始条目的发布时间在过去，e2e_pipeline 在测量前把它们标记为已处理，不会被推送
+        start = time.time() - 86400
+        for feed in range(options.feeds):
+            for i in range(options.items):
+                self._add_item(feed, start + i, record=False)
+
+    def _add_item(self, feed: int, published_at: float, record: bool = True):
+        items = self.feeds[feed]
+        index = items[-1]['index'] + 1 if items else 0
+        marker = MARKER_FORMAT.format(feed=feed, item=index)
+        padding = 'x' * max(0, self.options.description_bytes - 120)
+        items.append({
+            'index': index,
+            'title': f"{marker} 测试条目 标题",
+            'link': f"https://example.com/{feed}/{index}",
+            'pub_date': formatdate(published_at, usegmt=True),
+            'description': (f'<p>{padding}</p><img src="https://example.com/{feed}/{index}.jpg" />'
+                            f'<img src="https://example.com/{feed}/{index}-2.jpg" />'),
+        })
+        del items[:-self.options.items]
+        self._rendered.pop(feed, None)
+        if record:
+            self.published[marker] = published_at
+
+    async def publish_forever(self):
+        while True:
+            await asyncio.sleep(self.options.update_interval)
+            now = time.time()
+            for feed in range(self.options.feeds):
+                self._add_item(feed, now)
+
+    def _render(self, feed: int) -> tuple:
+        rendered = self._rendered.get(feed)
+        if rendered is None:
+            entries = ''.join(
+                f"<item><title>{item['title']}</title><link>{item['link']}</link>"
+                f"<guid>{item['link']}</guid><pubDate>{item['pub_date']}</pubDate>"
+                f"<description><![CDATA[{item['description']}]]></description></item>"
+                for item in reversed(self.feeds[feed])
+            )
+            body = ('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+                    f'<title>bench {feed}</title>{entries}</channel></rss>').encode('utf-8')
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            rendered = self._rendered[feed] = (body, etag)
+        return rendered
+
+    async def rss(self, request: web.Request) -> web.Response:
+        self.counters['rss_requests'] += 1
+        feed = int(request.match_info['feed'])
+        if feed >= len(self.feeds):
+            raise web.HTTPNotFound()
+        body, etag = self._render(feed)
+        if request.headers.get('If-None-Match') == etag:
+            self.counters['rss_not_modified'] += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, content_type='application/rss+xml', headers={'ETag': etag})
+
+    async def _params(self, request: web.Request) -> dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        return dict(await request.post())
+
+    def _chat(self, chat) -> dict:
+        chat = str(chat)
+        feed = int(chat[len('@bench_'):]) if chat.startswith('@bench_') else -1000000000000 - int(chat)
+        return {'id': channel_id(feed), 'type': 'channel', 'title': f"Bench {feed}",
+                'username': channel_name(feed)[1:]}
+
+    async def bot(self, request: web.Request) -> web.Response:
+        self.counters['bot_requests'] += 1
+        token = request.match_info['token']
+        method = request.match_info['method'].lower()
+        params = await self._params(request)
+        bot_id = int(token.split(':')[0])
+        bot_user = {'id': bot_id, 'is_bot': True, 'first_name': 'bench', 'username': f"bench{bot_id}_bot"}
+        if self.options.api_latency:
+            await asyncio.sleep(self.options.api_latency)
+
+        if method in ('sendphoto', 'sendmessage') and random.random() < self.options.retry_after_ratio:
+            self.counters['retry_after'] += 1
+            return web.json_response({
+                'ok': False, 'error_code': 429,
+                'description': f"Too Many Requests: retry after {self.options.retry_after}",
+                'parameters': {'retry_after': self.options.retry_after},
+            })
+
+        if method == 'getme':
+            result = dict(bot_user, can_join_groups=True, can_read_all_group_messages=False,
+                          supports_inline_queries=False)
+        elif method in ('setmycommands', 'deletewebhook', 'setwebhook'):
+            result = True
+        elif method == 'getchat':
+            result = dict(self._chat(params['chat_id']), accent_color_id=0, max_reaction_count=11,
+                          accepted_gift_types={'unlimited_gifts': False, 'limited_gifts': False,
+                                               'unique_gifts': False, 'premium_subscription': False,
+                                               'gifts_from_channels': False})
+        elif method == 'getchatmember':
+            result = {
+                'status': 'administrator', 'user': bot_user, 'can_be_edited': False,
+                'is_anonymous': False, 'can_manage_chat': True, 'can_delete_messages': True,
+                'can_manage_video_chats': True, 'can_restrict_members': True,
+                'can_promote_members': False, 'can_change_info': True, 'can_invite_users': True,
+                'can_post_stories': True, 'can_edit_stories': True, 'can_delete_stories': True,
+                'can_post_messages': True, 'can_edit_messages': True,
+            }
+        elif method in ('sendphoto', 'sendmessage'):
+            text = params.get('caption') or params.get('text') or ''
+            self.deliveries.append({'marker': text.split(' ', 1)[0], 'bot': bot_id,
+                                    'chat_id': params.get('chat_id'), 'received_at': time.time()})
+            result = {'message_id': next(self._message_ids), 'date': int(time.time()),
+                      'chat': self._chat(params['chat_id']), 'text': text}
+            photo = params.get('photo')
+            if photo:
+                # 地址形式的图片需要 Telegram 下载，file_id 形式的直接复用
+                if photo.startswith('http'):
+                    self.counters['photo_fetches'] += 1
+                    photo = 'file-' + hashlib.sha1(f"{bot_id}:{photo}".encode('utf-8')).hexdigest()
+                else:
+                    self.counters['photo_file_ids'] += 1
+                result['photo'] = [{'file_id': photo, 'file_unique_id': photo[-16:],
+                                    'width': 1280, 'height': 1920}]
+        else:
+            return web.json_response({'ok': False, 'error_code': 400,
+                                      'description': f"Bad Request: method {method} not supported"})
+        return web.json_response({'ok': True, 'result': result})
+
+    async def telegraph(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = await self._params(request)
+        if method == 'createAccount':
+            result = {'short_name': params.get('short_name'), 'access_token': 'bench-token'}
+        elif method == 'createPage':
+            self.counters['telegraph_pages'] += 1
+            result = {'path': f"bench-{next(self._page_ids)}", 'title': params.get('title')}
+        else:
+            return web.json_response({'ok': False, 'error': 'METHOD_NOT_FOUND'})
+        return web.json_response({'ok': True, 'result': result})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({'published': self.published, 'deliveries': self.deliveries,
+                                  'counters': self.counters})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/rss/{feed}', self.rss)
+        app.router.add_route('*', '/bot{token}/{method}', self.bot)
+        app.router.add_post('/telegraph/{method}', self.telegraph)
+        app.router.add_get('/stats', self.stats)
+        return app
+
+
+async def _serve(options: StandInOptions, port_queue):
+    stand_ins = StandIns(options)
+    runner = web.AppRunner(stand_ins.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port_queue.put(site._server.sockets[0].getsockname()[1])
+    await stand_ins.publish_forever()
+
+
+def serve(options: StandInOptions, port_queue):
+    """
+    子进程入口，启动后把监听端口写入 port_queue
+    """
+    asyncio.run(_serve(options, port_queue))
@@ -0,0 +1,145 @@
+"""
+启动耗时基准测试
+
+每个子系统在独立的解释器中单独导入，测量其导入耗时（包含依赖）；
+再在一个解释器中按 rss_bot.py 的顺序依次导入并初始化，测量每一步的增量耗时。
+初始化步骤不访问网络，指定 --database 时额外测量数据库连接池的初始化。
+
+用法:
+    python benchmarks/startup_time.py --repeat 5
+    python benchmarks/startup_time.py --database rss_bench --uvloop
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# 子系统及其入口模块
+SUBSYSTEMS = [
+    ('config', 'kernel.config'),
+    ('database', 'kernel.db_manager'),
+    ('feed_parser', 'kernel.feed_parser'),
+    ('feedparser', 'feedparser'),
+    ('telegraph', 'framework.telegraph_utils'),
+    ('telegram', 'business.telegram_bot'),
+    ('discord', 'business.discord_bot'),
+    ('metrics_server', 'aiohttp.web'),
+    ('uvloop', 'uvloop'),
+]
+
+
+def import_time(module: str) -> float:
+    """
+    在新的解释器中导入模块，返回导入耗时（毫秒），导入失败时返回 -1
+    """
+    code = (
+        "import sys, time\n"
+        f"sys.path.insert(0, {ROOT!r})\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print((time.perf_counter() - start) * 1000)\n"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT)
+    if result.returncode != 0:
+        return -1.0
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_startup(database: str, use_uvloop: bool) -> dict:
+    """
+    按启动顺序导入并初始化，返回每一步的增量耗时（毫秒）
+    """
+    steps = {}
+    last = time.perf_counter()
+
+    def mark(name):
+        nonlocal last
+        now = time.perf_counter()
+        steps[name] = (now - last) * 1000
+        last = now
+
+    from kernel.config import telegram_config, db_config, runtime_config
+    mark('import config')
+    runtime_config['uvloop'] = use_uvloop
+    import rss_bot
+    mark('import rss_bot')
+    from business import telegram_bot
+    mark('import telegram_bot')
+
+    loop = rss_bot.new_event_loop()
+    mark('event loop')
+
+    async def initialize():
+        from kernel.http_client import init_session, close_session
+        from kernel.rate_limiter import init_rate_limiter
+        from telegram.ext import ApplicationBuilder
+        await init_session()
+        mark('http session')
+        init_rate_limiter(telegram_config['bot_rate'], telegram_config['bot_burst'],
+                          telegram_config['chat_rate'], telegram_config['chat_burst'])
+        mark('rate limiter')
+        ApplicationBuilder().token('1:STARTUP').base_url(telegram_config['base_url']).build()
+        mark('telegram application')
+        if database:
+            from kernel.db_manager import init_db
+            init_db(db_config['host'], db_config['user'], db_config['password'], database,
+                    db_config['pool_size'])
+            mark('database')
+        await close_session()
+
+    loop.run_until_complete(initialize())
+    loop.close()
+    return steps
+
+
+def child(args) -> None:
+    print(json.dumps(measure_startup(args.database, args.uvloop)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='每项测量的重复次数，取中位数')
+    parser.add_argument('--database', help='测量数据库初始化时使用的 MySQL 数据库')
+    parser.add_argument('--uvloop', action='store_true', help='使用 uvloop 事件循环')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    print("import time per subsystem (fresh interpreter, median ms):")
+    for name, module in SUBSYSTEMS:
+        times = [import_time(module) for _ in range(args.repeat)]
+        if min(times) < 0:
+            print(f"  {name:<16} {module:<28} not installed")
+        else:
+            print(f"  {name:<16} {module:<28} {statistics.median(times):8.1f}")
+
+    command = [sys.executable, os.path.abspath(__file__), '--child']
+    if args.database:
+        command += ['--database', args.database]
+    if args.uvloop:
+        command.append('--uvloop')
+    runs = []
+    for _ in range(args.repeat):
+        result = subprocess.run(command, capture_output=True, text=True, cwd=ROOT, check=True)
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    print("startup sequence (incremental, median ms):")
+    total = 0.0
+    for step in runs[0]:
+        value = statistics.median(run[step] for run in runs)
+        total += value
+        print(f"  {step:<24} {value:8.1f}")
+    print(f"  {'total':<24} {total:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
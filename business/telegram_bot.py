@@ -1,19 +1,38 @@
 
 
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, \
-    filters, InlineQueryHandler, Application, CallbackContext, CallbackQueryHandler
+    filters, InlineQueryHandler, Application, CallbackContext, CallbackQueryHandler, ChatMemberHandler
+from telegram.error import BadRequest, Forbidden
 from telegram import Message, MessageEntity, Update, constants, InputMediaPhoto, \
     BotCommand, ChatMember, InlineKeyboardButton, InlineKeyboardMarkup
 from datetime import datetime
+from typing import NamedTuple
+from collections import deque
 from kernel.lang_config import get_message
-from kernel.config import telegram_config, db_config
-from kernel.db_manager import init_db, get_db
-from kernel.feed_parser import FeedItem, parse_feed
-from kernel.utils import generate_chinese_tags
+from kernel.config import telegram_config, db_config, scheduler_config, seen_config, outbox_config, \
+    metrics_config, telegraph_config, webhook_config, parse_config
+from kernel.db_manager import init_db, get_db, get_watermark_buffer
+from kernel.scheduler import init_engine, get_engine, FeedScheduler, entry_from_row
+from kernel.http_client import init_session, get_session, close_session
+from kernel.rate_limiter import init_rate_limiter, get_rate_limiter
+from kernel.seen_index import init_seen_index, get_seen_index
+from kernel.normalizer import normalize, normalize_items
+from kernel.metrics import start_metrics_server, stop_metrics_server, host_of, FEED_ITEMS_TOTAL, \
+    SCHEDULER_FEEDS, SCHEDULER_DUE_FEEDS, TELEGRAM_FILE_ID_TOTAL
+from kernel.file_id_cache import init_file_id_cache, get_file_id_cache
+from kernel.page_cache import init_page_cache
+from kernel.webhook import start_webhook_server, stop_webhook_server, webhook_secret
+from kernel.outbox import init_outbox, get_outbox, OutboxEntry, PermanentDeliveryError
+from kernel.cache import AsyncTTLCache
+from kernel.sharding import HashRing
+from kernel.feed_health import health_from_row, describe
+from kernel.feed_parser import FeedItem, parse_feed, stream_feed, close_parse_executor
+from kernel.item_scanner import ItemScanner
 from framework.telegraph_utils import publish_rss_item
 import re
 import asyncio
 import logging
+import time
 import sys
 import os
 import aiohttp
@@ -22,6 +41,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 tel_bots = []
+# 订阅分配到 bot 的一致性哈希环，节点为 bot id
+bot_ring = HashRing()
 commands = [
     BotCommand(command='help', description='Show help message'),
     BotCommand(command='sub', description='Subscribe to a channel'),
@@ -30,6 +51,26 @@ commands = [
 ]
 
 
+
+class ChatInfo(NamedTuple):
+    id: int
+    title: str
+    username: str
+    is_admin: bool
+
+
+# /pub 文件中 item 的字段
+TITLE_RE = re.compile(r'<title>(.*?)</title>')
+LINK_RE = re.compile(r'<link>(.*?)</link>')
+DESCRIPTION_RE = re.compile(r'<description>(.*?)</description>', re.DOTALL)
+# /pub 文件下载的分块大小（字节）和进度消息的最短更新间隔（秒）
+PUB_CHUNK_SIZE = 64 * 1024
+PUB_PROGRESS_INTERVAL = 5
+
+# 频道信息和 bot 管理员状态缓存，key 为 (bot id, 频道 ID 或 @频道名)
+chat_cache = AsyncTTLCache(telegram_config['chat_cache_ttl'], telegram_config['chat_cache_size'])
+
+
 async def post_init(application: Application) -> None:
     """
     Post initialization hook for the bot.
@@ -37,6 +78,53 @@ async def post_init(application: Application) -> None:
     await application.bot.set_my_commands(commands)
 
 
+async def get_chat_info(bot, chat, refresh=False) -> ChatInfo:
+    """
+    获取频道信息以及 bot 是否为管理员，结果会被缓存
+
+    bot 无法访问频道（BadRequest / Forbidden）时缓存一条非管理员的记录，
+    轮询和投递不会在每次调用时重复请求 Bot API；refresh 时照常抛出异常。
+
+    Args:
+        bot: Telegram bot
+        chat: 频道 ID 或 @频道名
+        refresh: 是否忽略缓存重新获取
+    """
+    key = (bot.id, chat.lower() if isinstance(chat, str) else chat)
+    if refresh:
+        chat_cache.invalidate(key)
+
+    async def load():
+        try:
+            info = await bot.get_chat(chat)
+            member = await bot.get_chat_member(info.id, bot.id)
+        except (BadRequest, Forbidden) as e:
+            if refresh:
+                raise
+            logging.info(f"Bot {bot.id} cannot access {chat}: {e}")
+            return ChatInfo(id=chat if isinstance(chat, int) else 0, title='', username='', is_admin=False)
+        return ChatInfo(id=info.id, title=info.title, username=info.username,
+                        is_admin=member.status == ChatMember.ADMINISTRATOR)
+
+    return await chat_cache.get(key, load)
+
+
+def invalidate_chat(bot_id, chat_id):
+    """
+    清除指定 bot 在某个频道的所有缓存（包括按频道名缓存的记录）
+    """
+    chat_cache.invalidate_if(lambda key, info: key[0] == bot_id and info.id == chat_id)
+
+
+async def on_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    bot 在频道中的成员状态变化时清除缓存
+    """
+    chat = update.my_chat_member.chat
+    logging.info(f"Bot member status changed in {chat.id}, invalidating chat cache")
+    invalidate_chat(context.bot.id, chat.id)
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     message = update.message
     logging.info(update.message)
@@ -60,6 +148,93 @@ async def help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text(help_text, disable_web_page_preview=True)
 
 
+def parse_pub_item(content):
+    """
+    解析 /pub 文件中的单个 <item> 片段
+
+    Returns:
+        NormalizedItem，缺少 title 或 description 时返回 None
+    """
+    title_match = TITLE_RE.search(content)
+    description_match = DESCRIPTION_RE.search(content)
+    if not title_match or not description_match:
+        return None
+    link_match = LINK_RE.search(content)
+    return normalize(FeedItem(
+        title=title_match.group(1),
+        description=description_match.group(1),
+        link=link_match.group(1) if link_match else "",
+        pubDate=int(datetime.now().timestamp())
+    ))
+
+
+async def download_pub_items(file_url):
+    """
+    下载 /pub 文件，边下载边切分并归一化 item
+
+    只下载一次，内存中只保留归一化后的条目和当前未闭合的 item。
+
+    Raises:
+        ValueError: item 缺少 title 或 description
+    """
+    scanner = ItemScanner()
+    items = []
+
+    def collect(contents):
+        for content in contents:
+            item = parse_pub_item(content)
+            if item is None:
+                raise ValueError('item标签必须包含title和description')
+            items.append(item)
+
+    async with get_session().get(file_url) as response:
+        # 文件地址中包含 bot token，错误信息中不能带上地址
+        if response.status != 200:
+            raise RuntimeError(f"下载文件失败: HTTP {response.status}")
+        async for chunk in response.content.iter_chunked(PUB_CHUNK_SIZE):
+            collect(scanner.feed(chunk))
+    collect(scanner.close())
+    return items
+
+
+async def publish_items(bot, chat, items, report):
+    """
+    按顺序将条目发布到频道
+
+    Telegraph 页面最多提前并发创建 TELEGRAPH_CONCURRENCY 个，发送仍按顺序经过限流器；
+    任一条目失败时取消尚未完成的页面创建并抛出异常。
+
+    Args:
+        bot: Telegram bot
+        chat: 目标频道的 ChatInfo
+        items: 按发布顺序排列的 NormalizedItem 列表
+        report: 每发送一条后调用的协程函数，参数为已发送数量
+    """
+    url = f"https://t.me/{chat.username}"
+
+    async def create(item):
+        page_link, _ = await publish_rss_item(item, chat.title, url)
+        if not page_link:
+            raise RuntimeError("Failed to create Telegraph page")
+        return page_link
+
+    window = max(1, telegraph_config['concurrency'])
+    pending = deque()
+    scheduled = 0
+    try:
+        for done, item in enumerate(items, 1):
+            while scheduled < len(items) and len(pending) < window:
+                pending.append(asyncio.create_task(create(items[scheduled])))
+                scheduled += 1
+            page_link = await pending.popleft()
+            await send_item(bot, chat.id, item, page_link)
+            await report(done)
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
 async def pub(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     手动发布RSS条目到频道
@@ -94,10 +269,11 @@ async def pub(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
         # 检查频道访问权限
         bot = context.bot
-        chat = await bot.get_chat(channel_name)
-        bot_member = await bot.get_chat_member(chat.id, bot.id)
+        chat = await get_chat_info(bot, channel_name)
+        if not chat.is_admin:
+            chat = await get_chat_info(bot, channel_name, refresh=True)
 
-        if bot_member.status != ChatMember.ADMINISTRATOR:
+        if not chat.is_admin:
             await update.message.reply_text(f'我需要在{channel_name}中具有管理员权限')
             return
 
@@ -106,72 +282,55 @@ async def pub(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text(f"无法访问 {channel_name}")
         return
 
-    # 4. 下载并读取文件内容
+    # 4. 下载文件，边下载边解析 item
     try:
         file = await document.get_file()
-        item_content_bytes = await file.download_as_bytearray()
-        item_content = item_content_bytes.decode('utf-8')
-        # 确保内容包含 <item> 标签 (基本检查)
-        if '<item>' not in item_content or '</item>' not in item_content:
-             await update.message.reply_text('文件内容似乎不包含有效的 <item>...</item> 结构。')
-             return
-    except Exception as e:
+        items = await download_pub_items(file.file_path)
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+    except Exception:
+        # 下载错误中包含带 bot token 的文件地址，只写入日志
         logging.exception("下载或读取文件时出错")
-        await update.message.reply_text(f"处理文件时出错: {e}")
+        await update.message.reply_text("处理文件时出错，请稍后重试")
         return
 
-    # 5. 提取item标签内的内容 (使用从文件获取的 item_content)
-    file = await document.get_file()
-    content_bytes = await file.download_as_bytearray()
-    content = content_bytes.decode('utf-8')
-
-    items_content = re.findall(r'<item>.*?</item>', content, re.DOTALL)
-    if not items_content:
+    if not items:
         await update.message.reply_text('文件中未找到有效的<item>标签')
         return
 
-    for item_content in reversed(items_content):
-        title_match = re.search(r'<title>(.*?)</title>', item_content)
-        logging.info(item_content)
-        link_match = re.search(r'<link>(.*?)</link>', item_content)
-        logging.info(link_match)
-        description_match = re.search(r'<description>(.*?)</description>', item_content, re.DOTALL)
-
-        if not title_match or not description_match:
-            await update.message.reply_text('item标签必须包含title和description')
-            return
-
-        # 构造FeedItem对象
-        item = FeedItem(
-            title=title_match.group(1),
-            description=description_match.group(1),
-            link=link_match.group(1) if link_match else "",
-            pubDate=int(datetime.now().timestamp())
-        )
+    # 5. 文件中的条目从新到旧排列，按从旧到新的顺序发布
+    items.reverse()
+    total = len(items)
+    limiter = get_rate_limiter()
+    status = await update.message.reply_text(f"正在发布到 {channel_name}: 0/{total}")
+    last_report = time.monotonic()
+    published = 0
 
+    async def edit_status(text):
         try:
-            # 发布到Telegraph并发送到频道
-            url = f"https://t.me/{chat.username}"
-            page_link, _ = publish_rss_item(item, chat.title, url)
-            logging.info(page_link)
-            tags = generate_chinese_tags(item.title)
-            logging.info(tags)
-            text_msg = f"{item.title}\n\n{page_link}\n{tags}"
-            logging.info(text_msg)
-
-            # 提取图片链接并发送消息
-            image_urls = re.findall(r'<img[^>]+src="([^">]+)"', item.description)
-            if image_urls:
-                await bot.send_photo(chat_id=chat.id, photo=image_urls[0], caption=text_msg)
-            else:
-                await bot.send_message(chat_id=chat.id, text=text_msg)
+            await limiter.send(bot, status.chat_id, bot.edit_message_text,
+                               message_id=status.message_id, text=text)
+        except Exception as e:
+            logging.warning(f"更新发布进度失败: {e}")
 
-            await asyncio.sleep(3)  # 每条消息发送后等待3秒
+    async def report(done):
+        nonlocal last_report, published
+        published = done
+        if done == total or time.monotonic() - last_report < PUB_PROGRESS_INTERVAL:
+            return
+        last_report = time.monotonic()
+        await edit_status(f"正在发布到 {channel_name}: {done}/{total}")
 
-        except Exception as e:
-            logging.exception("发布过程出错:")  # 打印完整堆栈
-            await update.message.reply_text(f"发布失败: {str(e)}")
-            return  # 失败立即退出
+    try:
+        await publish_items(bot, chat, items, report)
+    except Exception as e:
+        if isinstance(e, Forbidden):
+            invalidate_chat(bot.id, chat.id)
+        logging.exception("发布过程出错:")  # 打印完整堆栈
+        await edit_status(f"发布失败（已发布 {published}/{total}）: {e}")
+        return  # 失败立即退出
+    await edit_status(f"已发布 {total} 条到 {channel_name}")
 
 
 async def sub(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -198,25 +357,30 @@ async def sub(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         # 3. 获取频道信息
         bot = context.bot
         logging.info(channel_name)
-        chat = await bot.get_chat(channel_name)
+        chat = await get_chat_info(bot, channel_name)
         logging.info(chat)
 
-        # 4. 检查机器人是否是频道管理员
-        bot_member = await bot.get_chat_member(chat.id, bot.id)
-        if bot_member.status != ChatMember.ADMINISTRATOR:
+        # 4. 检查机器人是否是频道管理员，缓存结果为否时重新确认
+        if not chat.is_admin:
+            chat = await get_chat_info(bot, channel_name, refresh=True)
+        if not chat.is_admin:
             await update.message.reply_text(get_message(lang, 'sub_admin_required', channel_name))
             return
 
         # 5. 获取当前订阅
         db = get_db()
-        subscriptions = db.get_subscriptions(chat.id)
+        subscriptions = await db.get_subscriptions(chat.id)
 
         # 6. 根据参数数量执行不同操作
         if len(args) == 2:
             # 只提供了频道名称，显示当前订阅
             if subscriptions:
-                url_list = [subscription['feed_url']
-                            for subscription in subscriptions]
+                # 每个订阅附带 feed 的健康状态
+                healths = await db.get_feed_healths([subscription['feed_url'] for subscription in subscriptions])
+                url_list = []
+                for subscription in subscriptions:
+                    health = health_from_row(healths.get(subscription['feed_url']))
+                    url_list.append(f"{subscription['feed_url']} ({describe(health)})")
                 url_text = "\n".join(url_list)
                 await update.message.reply_text(f"The following URLs are subscribed in {channel_name}:\n{url_text}")
             else:
@@ -234,15 +398,16 @@ async def sub(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 subscription = existing_sub
                 await update.message.reply_text(get_message(lang, 'sub_already_exists', channel_name))
             else:
-                subscription_id = db.add_subscription(
+                subscription_id = await db.add_subscription(
                     chat.id, channel_name, feed_url)
                 subscription = next(
-                    (sub for sub in db.get_subscriptions() if sub['id'] == subscription_id), None)
+                    (sub for sub in await db.get_subscriptions(chat.id) if sub['id'] == subscription_id), None)
             await update.message.reply_text(get_message(lang, 'sub_processing'))
 
-            # 处理订阅
+            # 处理订阅，与定时任务共用同一把订阅锁以保证顺序
             try:
-                await process_sub(context.bot, subscription)
+                async with get_engine().lock(subscription['id']):
+                    await process_sub(context.bot, subscription)
             except Exception as e:
                 logging.error(e)
             # 发送结束消息
@@ -275,12 +440,12 @@ async def unsub(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Check if the channel exists and if the bot is an admin
     try:
         bot = context.bot
-        # Get chat information
-        chat = await bot.get_chat(channel_name)
-        # Check if bot is a member and admin in the channel
-        bot_member = await bot.get_chat_member(chat.id, bot.id)
+        # Get chat information and check if bot is an admin in the channel
+        chat = await get_chat_info(bot, channel_name)
+        if not chat.is_admin:
+            chat = await get_chat_info(bot, channel_name, refresh=True)
 
-        if bot_member.status != ChatMember.ADMINISTRATOR:
+        if not chat.is_admin:
             await update.message.reply_text(get_message(lang, 'unsub_admin_required', channel_name))
             return
 
@@ -290,7 +455,7 @@ async def unsub(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
             # 从数据库中删除订阅
             db = get_db()
-            success = db.remove_subscription(chat.id, feed_url)
+            success = await db.remove_subscription(chat.id, feed_url)
 
             if success:
                 await update.message.reply_text(get_message(lang, 'unsub_processing'))
@@ -304,13 +469,19 @@ async def unsub(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text(get_message(lang, 'unsub_channel_error', channel_name))
 
 
-async def run(token):
+async def run(token, worker=False):
     """
     Runs the bot indefinitely until the user presses Ctrl+C
+
+    Args:
+        token: bot token
+        worker: 是否以 worker 模式运行（不拉取命令更新）
     """
     global tel_bots
     application = ApplicationBuilder() \
         .token(token) \
+        .base_url(telegram_config['base_url']) \
+        .base_file_url(telegram_config['base_file_url']) \
         .concurrent_updates(True) \
         .connect_timeout(30) \
         .read_timeout(30) \
@@ -327,11 +498,29 @@ async def run(token):
     application.add_handler(CommandHandler('unsub', unsub))
     # 使用 MessageHandler 监听任何文档，然后在 pub 函数内部检查标题和其他条件
     application.add_handler(MessageHandler(filters.Document.ALL, pub))
+    application.add_handler(ChatMemberHandler(on_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER))
 
     await application.initialize()
+    bot_ring.add(application.bot.id)
     await application.start()
     logging.info("start up successful ……")
-    await application.updater.start_polling(drop_pending_updates=True)
+    # 有 bot 可用后开始投递队列中的条目
+    get_outbox().start(deliver_entry)
+    # worker 进程只负责轮询和发送，不接收命令
+    if worker:
+        return application
+    if webhook_config['enabled']:
+        if not webhook_config['url']:
+            raise RuntimeError("TG_WEBHOOK_URL is required when TG_UPDATE_MODE=webhook")
+        server = await start_webhook_server(webhook_config['host'], webhook_config['port'])
+        secret = webhook_secret(token)
+        server.register(application, secret)
+        await application.bot.set_webhook(
+            url=f"{webhook_config['url']}/webhook/{application.bot.id}",
+            secret_token=secret, drop_pending_updates=True)
+    else:
+        await application.updater.start_polling(drop_pending_updates=True)
+    return application
 
 
 async def init_task():
@@ -340,130 +529,405 @@ async def init_task():
     """
     # 初始化数据库连接
     init_db(db_config['host'], db_config['user'],
-            db_config['password'], db_config['database'])
+            db_config['password'], db_config['database'],
+            db_config['pool_size'], db_config['flush_interval'],
+            db_config['flush_size'])
     logging.info("Database initialized")
+    init_engine(scheduler_config['concurrency'],
+                scheduler_config['per_host_concurrency'])
+    # 初始化共享 HTTP 会话
+    await init_session()
+    init_rate_limiter(telegram_config['bot_rate'], telegram_config['bot_burst'],
+                      telegram_config['chat_rate'], telegram_config['chat_burst'],
+                      telegram_config['send_retries'])
+    init_seen_index(seen_config['cache_size'])
+    init_file_id_cache(telegram_config['file_id_cache_size'], telegram_config['file_id_cache_days'] * 86400)
+    init_page_cache(telegraph_config['page_cache_days'] * 86400, telegraph_config['page_cache_size'])
+    init_outbox(scheduler_config['worker_id'], outbox_config['workers'],
+                outbox_config['batch_size'], outbox_config['lease_seconds'],
+                outbox_config['max_attempts'], outbox_config['base_delay'],
+                outbox_config['max_delay'], outbox_config['idle_interval'],
+                outbox_config['retention_days'])
+    # init_task 与 start_task、scheduled_task 并发运行，单例必须在第一次让出事件循环之前初始化完毕
+    if metrics_config['enabled']:
+        await start_metrics_server(metrics_config['host'], metrics_config['port'])
     logging.info("init vars and sd_webui end")
 
 
-async def start_task(token):
-    return await run(token)
+async def start_task(token, worker=False):
+    return await run(token, worker)
 
 
-def close_all():
-    # 关闭数据库连接
+async def shutdown():
+    """|coro|
+    释放异步资源
+    """
+    # 先停止投递，未完成的条目放回队列
     try:
-        get_db().close()
+        await get_outbox().close()
+    except Exception as e:
+        logging.error(f"Error closing outbox: {e}")
+    await stop_webhook_server()
+    await stop_metrics_server()
+    await close_session()
+    close_parse_executor()
+    # 写入缓冲中的订阅时间戳并关闭数据库连接
+    try:
+        if scheduler_config['mode'] == 'lease':
+            # 释放租约，其他 worker 无需等待租约过期即可接手
+            await get_db().release_leases(scheduler_config['worker_id'])
+        await get_watermark_buffer().close()
+        await get_db().close()
     except Exception as e:
         logging.error(f"Error closing database: {e}")
     logging.info("db close")
 
 
-async def process_sub(bot, subscription):
-    logging.info(subscription)
+def close_all():
+    # 在已停止的事件循环上释放异步资源
+    try:
+        asyncio.get_event_loop().run_until_complete(shutdown())
+    except Exception as e:
+        logging.error(f"Error during shutdown: {e}")
+
+
+async def process_sub(bot, subscription, items=None):
+    """
+    将订阅中的新条目加入投递队列，由投递 worker 发送到频道
+
+    Args:
+        bot: Telegram bot
+        subscription: 订阅记录
+        items: 已解析的条目列表，为 None 时自行抓取
+    """
     subscription_id = subscription['id']
     chat_id = subscription['channel_id']
     channel_name = subscription['channel_name']
     feed_url = subscription['feed_url']
 
     # 检查bot是否是频道管理员
-    chat = await bot.get_chat(channel_name)
-    logging.info(chat)
-    bot_member = await bot.get_chat_member(chat_id, bot.id)
-    if bot_member.status == ChatMember.ADMINISTRATOR:
-        items = await parse_feed(feed_url)
+    chat = await get_chat_info(bot, channel_name)
+    if chat.is_admin:
+        if items is None:
+            items = normalize_items(await parse_feed(feed_url))
         last_updated = subscription.get('updated_at')
         if last_updated is None:
             last_updated = 0
         else:
             last_updated = last_updated.timestamp()
-        logging.info(f"last_updated: {last_updated}")
-        item_latest = last_updated
-        for item in reversed(items):
-            # 获取item的pubDate时间戳
-            item_timestamp = item.pubDate
-            logging.info(f"pubDate: {item.pubDate}")
-
-            # 如果item的时间早于或等于上次更新时间，跳过
-            if item_timestamp <= last_updated:
-                continue
-
-            if item_latest < item_timestamp:
-                item_latest = item_timestamp
-            logging.info(f"item_latest: {item_latest}")
-            # 处理description中的图片
-            if item.description:
-                # 提取所有图片链接
-                image_urls = re.findall(
-                    r'<img[^>]+src="([^">]+)"', item.description)
-
-                # 准备消息内容
-                first_word = "美人图"  # 默认值
-                if item.title:
-                    # 使用正则表达式匹配第一个包含汉字、日语或字母数字的单词
-                    match = re.search(
-                        r'[\u4e00-\u9fa5\u3040-\u309F\u30A0-\u30FFa-zA-Z0-9]+', item.title)
-                    if match:
-                        first_word = match.group(0)
-
-                # 发布到Telegraph
-                try:
-                    url = f"https://t.me/{chat.username}"
-                    logging.info(f"chat.title: {chat.title}, chat.url: {url}")
-                    page_link, _ = publish_rss_item(item, chat.title, url)
-                    logging.info(f"page_link: {page_link}")
-                    tags = generate_chinese_tags(item.title)
-                    text_msg=f"{item.title}\n\n{page_link}\n{tags}"
-                    logging.info(f"text_msg: {text_msg}")
-
-                    # 如果有图片，发送第一张图片并附带caption
-                    if image_urls:
-                        await bot.send_photo(
-                            chat_id=chat_id,
-                            photo=image_urls[0],
-                            caption=text_msg
-                        )
-                    else:
-                        # 没有图片则保持原样发送文本
-                        await bot.send_message(
-                            chat_id=chat_id,
-                            text=text_msg
-                        )
-
-                    # 更新数据库中的updated_at时间戳
-                    updated_at = datetime.fromtimestamp(item_latest)
-                    get_db().update_subscription_timestamp(
-                        subscription_id, updated_at)
-                    await asyncio.sleep(3)
-                except Exception as e:
-                    logging.exception("An error occurred:")
-                    logging.error(e)
-
+        # 通过已处理条目索引（guid/link 哈希）过滤出新条目
+        seen_index = get_seen_index()
+        new_items, processed = await seen_index.select_new(subscription_id, items, last_updated)
+        # 没有描述的条目不发送，按从旧到新的顺序入队
+        deliveries = [item for item in reversed(new_items) if item.has_description]
+        count = await get_outbox().enqueue(subscription_id, deliveries)
+        host = host_of(feed_url)
+        FEED_ITEMS_TOTAL.inc(len(deliveries), host=host, kind='new')
+        FEED_ITEMS_TOTAL.inc(len(processed) + len(new_items) - len(deliveries), host=host, kind='skipped')
+        if count:
+            logging.info(f"Queued {count} new items for {channel_name}")
+        # 入队后即视为已处理，重复入队由队列的幂等键去重
+        processed.extend(item.item_id for item in new_items)
+        await seen_index.mark_seen(subscription_id, processed)
+        newest = max((item.pubDate for item in new_items), default=0)
+        if newest > last_updated:
+            get_watermark_buffer().record(subscription_id, datetime.fromtimestamp(newest))
 
     else:
         logging.info(
             f"Bot is not an administrator in channel {channel_name} (ID: {chat_id})")
 
 
-async def scheduled_task():
-    await asyncio.sleep(4*60)
+async def send_item(bot, chat_id, item, page_link):
+    """
+    将归一化后的条目发送到频道，有图片时发送第一张图片并附带 caption
+    """
+    text_msg = f"{item.title}\n\n{page_link}\n{item.tags}"
+
+    limiter = get_rate_limiter()
+    if item.image_urls:
+        await send_photo(bot, chat_id, item.image_urls[0], text_msg)
+    else:
+        # 没有图片则保持原样发送文本
+        await limiter.send(bot, chat_id, bot.send_message, text=text_msg)
+
+
+async def send_photo(bot, chat_id, image_url, caption):
+    """
+    发送图片，优先使用该 bot 之前发送同一图片得到的 file_id
+
+    file_id 被 Telegram 拒绝时删除缓存并改用图片地址重新发送。
+    """
+    limiter = get_rate_limiter()
+    file_ids = get_file_id_cache()
+    file_id = await file_ids.get(bot.id, image_url)
+    if file_id is not None:
+        try:
+            message = await limiter.send(bot, chat_id, bot.send_photo, photo=file_id, caption=caption)
+            TELEGRAM_FILE_ID_TOTAL.inc(result='hit')
+            return message
+        except BadRequest as e:
+            TELEGRAM_FILE_ID_TOTAL.inc(result='stale')
+            logging.warning(f"Cached file_id for {image_url} rejected: {e}")
+            await file_ids.invalidate(bot.id, image_url)
+
+    TELEGRAM_FILE_ID_TOTAL.inc(result='miss')
+    message = await limiter.send(bot, chat_id, bot.send_photo, photo=image_url, caption=caption)
+    if message.photo:
+        # 最后一个尺寸是原图
+        await file_ids.put(bot.id, image_url, message.photo[-1].file_id)
+    return message
+
+
+async def deliver_entry(entry: OutboxEntry):
+    """
+    投递队列中的单个条目：创建 Telegraph 页面并发送到频道
+
+    页面链接在发送前写回队列，发送失败重试时不会重复创建页面。
+    """
+    subscription = {'channel_id': entry.channel_id, 'channel_name': entry.channel_name}
+    bot = await pick_bot(subscription)
+    if bot is None:
+        raise RuntimeError(f"No bot is an administrator in channel {entry.channel_name}")
+
+    page_link = entry.page_link
+    if not page_link:
+        chat = await get_chat_info(bot, entry.channel_name)
+        url = f"https://t.me/{chat.username}"
+        page_link, _ = await publish_rss_item(entry.item, chat.title, url)
+        if not page_link:
+            raise RuntimeError("Failed to create Telegraph page")
+        await get_outbox().save_page(entry, page_link)
+
+    try:
+        await send_item(bot, entry.channel_id, entry.item, page_link)
+    except Forbidden:
+        # bot 已无权在频道发送，清除缓存，重试时会选择其他 bot
+        invalidate_chat(bot.id, entry.channel_id)
+        raise
+    except BadRequest as e:
+        raise PermanentDeliveryError(str(e)) from e
+
+
+async def pick_bot(subscription):
+    """
+    为订阅选择负责的 bot
+
+    在频道中具有管理员权限的 bot 里，按频道 ID 在一致性哈希环上选择，
+    增减 bot 时只有少量频道会换到其他 bot。
+    """
+    admins = {}
+    for bot in tel_bots:
+        try:
+            chat = await get_chat_info(bot, subscription['channel_name'])
+        except Exception as e:
+            logging.info(f"Bot {bot.id} cannot access {subscription['channel_name']}: {e}")
+            continue
+        if chat.is_admin:
+            admins[bot.id] = bot
+    owner = bot_ring.owner(str(subscription['channel_id']), admins)
+    return admins.get(owner)
+
+
+async def poll_feed(feed_url, subscriptions):
+    """
+    抓取并解析一次 feed，然后分发给所有订阅了它的频道
+
+    每个订阅使用自己的 updated_at 进行过滤，并只由分配给它的一个 bot 处理。
+    有订阅处理失败时清除条件请求缓存，下一次轮询不会因 304 或内容未变化而跳过这些条目。
+
+    Returns:
+        items: 本次抓取到的条目，feed 未变化时返回 None
+    """
+    # 使用条件请求，feed 未变化时直接跳过；所有订阅共用同一份归一化结果
+    if parse_config['streaming']:
+        # 早于所有订阅 watermark 的条目对每个订阅都已处理过，不必读取
+        watermarks = [subscription.get('updated_at') for subscription in subscriptions]
+        since = 0 if not watermarks or None in watermarks else min(watermark.timestamp() for watermark in watermarks)
+        items = await stream_feed(feed_url, since, conditional=True)
+        if not items:
+            return items
+    else:
+        items = await parse_feed(feed_url, conditional=True)
+        if not items:
+            return items
+        items = normalize_items(items)
+    FEED_ITEMS_TOTAL.inc(len(items), host=host_of(feed_url), kind='found')
+
+    async def deliver(subscription) -> bool:
+        async with get_engine().lock(subscription['id']):
+            try:
+                bot = await pick_bot(subscription)
+                if bot is None:
+                    logging.info(f"No bot is an administrator in channel {subscription['channel_name']}")
+                    return False
+                await process_sub(bot, subscription, items)
+                return True
+            except Exception as e:
+                logging.error(e)
+                return False
+
+    results = await asyncio.gather(*(deliver(subscription) for subscription in subscriptions))
+    if not all(results):
+        try:
+            await get_db().delete_feed_cache(feed_url)
+        except Exception as e:
+            logging.error(f"Error clearing feed cache of {feed_url}: {e}")
+    return items
+
+
+async def poll_scheduled_feed(scheduler, feed_url, subscriptions):
+    """
+    轮询一个到期的 feed 并安排下一次轮询
+    """
+    items = None
+    try:
+        items = await poll_feed(feed_url, subscriptions)
+    finally:
+        entry = scheduler.reschedule(
+            feed_url, [item.pubDate for item in items or []], bool(items))
+        logging.debug(f"Next poll of {feed_url} in {entry.next_at - time.time():.0f}s")
+        await get_db().save_feed_schedule(
+            feed_url, int(entry.interval), datetime.fromtimestamp(entry.next_at),
+            datetime.fromtimestamp(entry.last_item_at) if entry.last_item_at else None)
+
+
+async def poll_leased_feed(scheduler, schedule, subscriptions, held):
+    """
+    轮询一个通过租约领取的 feed，然后保存下一次轮询时间并释放租约
+
+    Args:
+        held: 仍持有租约的 feed_url 集合，释放后从中移除，不再续期
+    """
+    feed_url = schedule['feed_url']
+    items = None
+    try:
+        items = await poll_feed(feed_url, subscriptions)
+    finally:
+        held.discard(feed_url)
+        entry = scheduler.plan(entry_from_row(schedule), [item.pubDate for item in items or []],
+                               bool(items), time.time())
+        released = await get_db().release_feed(
+            scheduler_config['worker_id'], feed_url, int(entry.interval),
+            datetime.fromtimestamp(entry.next_at),
+            datetime.fromtimestamp(entry.last_item_at) if entry.last_item_at else None)
+        if not released:
+            logging.warning(f"Lease on {feed_url} was lost before the poll finished")
+
+
+async def renew_leases_forever(held):
+    """
+    定期续期仍持有的 feed 租约，直到被取消
+
+    Args:
+        held: 仍持有租约的 feed_url 集合，轮询完成的 feed 会从中移除
+    """
+    lease_seconds = scheduler_config['lease_seconds']
     while True:
+        await asyncio.sleep(lease_seconds / 3)
+        feed_urls = list(held)
+        if not feed_urls:
+            continue
         try:
-            # 检查所有订阅
-            db = get_db()
-            subscriptions = db.get_subscriptions()
-            # 遍历所有订阅
-            for bot in tel_bots:
-                for subscription in subscriptions:
-                    # 处理订阅
-                    try:
-                        await process_sub(bot, subscription)
-                    except Exception as e:
-                        logging.error(e)
+            renewed = await get_db().renew_leases(scheduler_config['worker_id'], feed_urls, lease_seconds)
+            # 续期期间释放的租约不算丢失
+            expected = len(held.intersection(feed_urls))
+            if renewed < expected:
+                logging.warning(f"Renewed {renewed} of {expected} feed leases")
+        except Exception as e:
+            logging.error(f"Error renewing feed leases: {e}")
+
 
+async def leased_scheduled_task():
+    """
+    多 worker 模式的定时任务
+
+    轮询计划保存在 feed_schedule 表中，每个 worker 通过租约领取到期的 feed，
+    同一 feed 在租约有效期内只会被一个 worker 处理。
+    """
+    worker_id = scheduler_config['worker_id']
+    # 只用于计算下一次轮询时间，不保存状态
+    scheduler = FeedScheduler(
+        scheduler_config['interval'],
+        scheduler_config['min_interval'],
+        scheduler_config['max_interval'],
+        scheduler_config['jitter'])
+    logging.info(f"Polling in lease mode as worker {worker_id}")
+    while True:
+        claimed = []
+        try:
+            db = get_db()
+            await db.sync_feed_schedules(scheduler_config['interval'])
+            claimed = await db.claim_due_feeds(
+                worker_id, scheduler_config['claim_batch'], scheduler_config['lease_seconds'])
+            if claimed:
+                feeds = {}
+                for subscription in await db.get_subscriptions():
+                    feeds.setdefault(subscription['feed_url'], []).append(subscription)
+                logging.info(f"Claimed {len(claimed)} feeds")
+                SCHEDULER_FEEDS.set(len(feeds))
+                SCHEDULER_DUE_FEEDS.set(len(claimed))
+                held = {schedule['feed_url'] for schedule in claimed}
+                jobs = [
+                    (schedule['feed_url'], schedule['feed_url'],
+                     lambda schedule=schedule: poll_leased_feed(
+                         scheduler, schedule, feeds.get(schedule['feed_url'], []), held))
+                    for schedule in claimed
+                ]
+                heartbeat = asyncio.ensure_future(renew_leases_forever(held))
+                try:
+                    await get_engine().run_cycle(jobs)
+                finally:
+                    heartbeat.cancel()
+                logging.info(f"Chat cache: {chat_cache.stats()}")
         except Exception as e:
             logging.error(e)
-        finally:
-            await asyncio.sleep(4*60*60)
+        # 领取到一整批时可能还有到期的 feed，立即继续
+        if len(claimed) < scheduler_config['claim_batch']:
+            await asyncio.sleep(scheduler_config['tick'])
 
 
+async def scheduled_task():
+    await asyncio.sleep(scheduler_config['startup_delay'])
+    if scheduler_config['mode'] == 'lease':
+        return await leased_scheduled_task()
+    scheduler = FeedScheduler(
+        scheduler_config['interval'],
+        scheduler_config['min_interval'],
+        scheduler_config['max_interval'],
+        scheduler_config['jitter'])
+    try:
+        scheduler.load(await get_db().get_feed_schedules())
+    except Exception as e:
+        logging.error(f"Error loading feed schedules: {e}")
+    while True:
+        try:
+            # 检查所有订阅，按 feed_url 分组
+            db = get_db()
+            feeds = {}
+            for subscription in await db.get_subscriptions():
+                feeds.setdefault(subscription['feed_url'], []).append(subscription)
+            scheduler.sync(feeds)
+            # 每个到期的 feed 只抓取一次
+            due = scheduler.pop_due()
+            SCHEDULER_FEEDS.set(len(feeds))
+            SCHEDULER_DUE_FEEDS.set(len(due))
+            if due:
+                logging.info(f"Polling {len(due)} of {len(feeds)} feeds")
+                jobs = [
+                    (feed_url, feed_url,
+                     lambda feed_url=feed_url: poll_scheduled_feed(scheduler, feed_url, feeds[feed_url]))
+                    for feed_url in due
+                ]
+                await get_engine().run_cycle(jobs)
+                logging.info(f"Chat cache: {chat_cache.stats()}")
 
+        except Exception as e:
+            logging.error(e)
+        finally:
+            # 休眠到下一个 feed 到期，但不超过 tick 以便发现新增订阅
+            next_due = scheduler.next_due()
+            delay = scheduler_config['tick']
+            if next_due is not None:
+                delay = min(delay, next_due - time.time())
+            await asyncio.sleep(max(delay, 1))
@@ -3,63 +3,243 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from PIL import Image
-import io
-import requests
-import re
-from telegraph import Telegraph
+import asyncio
+import json
+import logging
+import random
+import time
+from html.parser import HTMLParser
+import aiohttp
 from kernel.config import telegraph_config, update_env_variable
-from kernel.feed_parser import FeedItem
+from kernel.normalizer import NormalizedItem, normalize
+from kernel.http_client import get_session, close_session
+from kernel.metrics import TELEGRAPH_REQUEST_SECONDS
+from kernel.page_cache import page_key, get_page_cache
 
-# 从配置中获取 TELEGRAPH_ACCESS_TOKEN
-access_token = telegraph_config.get('access_token')
+# 表示 token 无效、需要更换账号的错误
+TOKEN_ERRORS = {'ACCESS_TOKEN_INVALID', 'ACCESS_TOKEN_REQUIRED'}
+# 请求过于频繁，后面跟需要等待的秒数
+FLOOD_WAIT_PREFIX = 'FLOOD_WAIT_'
 
-# 全局初始化 Telegraph 实例
-if access_token:
-    telegraph = Telegraph(access_token=access_token)
-else:
-    telegraph = Telegraph()
-    print("警告：未在配置中找到 TELEGRAPH_ACCESS_TOKEN 的配置。后续操作可能会失败，请确保正确配置。")
+# 没有子节点的 HTML 标签
+VOID_TAGS = {'br', 'hr', 'img'}
 
 
-def create_page(title, content, author_name="Default Author", author_url="https://example.com", max_retries=5):
+class TelegraphError(Exception):
+    """
+    Telegraph API 返回的错误
+    """
+
+
+class _NodeBuilder(HTMLParser):
+    """
+    将 HTML 转换为 Telegraph 的 Node 列表
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.nodes = []
+        self._stack = []
+
+    def _append(self, node):
+        if self._stack:
+            self._stack[-1].setdefault('children', []).append(node)
+        else:
+            self.nodes.append(node)
+
+    def handle_starttag(self, tag, attrs):
+        node = {'tag': tag}
+        attrs = {name: value for name, value in attrs if value is not None}
+        if attrs:
+            node['attrs'] = attrs
+        self._append(node)
+        if tag not in VOID_TAGS:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self._stack.pop()
+
+    def handle_endtag(self, tag):
+        # 忽略不匹配的结束标签
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i]['tag'] == tag:
+                del self._stack[i:]
+                break
+
+    def handle_data(self, data):
+        if data:
+            self._append(data)
+
+
+def html_to_nodes(html):
+    """
+    将 HTML 字符串转换为 Telegraph Node 列表
+    """
+    builder = _NodeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.nodes
+
+
+class TelegraphClient:
+    """
+    基于共享 aiohttp 会话的异步 Telegraph 客户端
+
+    网络错误和 API 错误按指数退避重试，FLOOD_WAIT_n 时等待 n 秒。
+    只有 createPage 因 token 无效失败时才创建新账号（新账号无法编辑旧账号的页面），
+    每次调用最多创建一次，并发请求同时失败时也只会创建一次新账号。
+    """
+
+    def __init__(self, access_token=None, api_url='https://api.telegra.ph', short_name='meiseshow',
+                 timeout=30, base_delay=1.0, max_delay=30.0):
+        self.access_token = access_token
+        self.api_url = api_url.rstrip('/')
+        self.short_name = short_name
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._token_lock = asyncio.Lock()
+
+    async def _request(self, method, path='', **values):
+        """
+        调用一次 Telegraph API
+        """
+        url = f"{self.api_url}/{method}/{path}" if path else f"{self.api_url}/{method}"
+        data = {key: value for key, value in values.items() if value is not None}
+        start = time.perf_counter()
+        outcome = 'exception'
+        try:
+            async with get_session().post(url, data=data, timeout=self.timeout) as response:
+                result = await response.json(content_type=None)
+            outcome = 'ok' if result.get('ok') else 'error'
+        finally:
+            TELEGRAPH_REQUEST_SECONDS.observe(time.perf_counter() - start, method=method, outcome=outcome)
+        if not result.get('ok'):
+            raise TelegraphError(result.get('error'))
+        return result['result']
+
+    async def rotate_token(self, stale_token):
+        """
+        创建新账号并更新 token
+
+        只有当前 token 仍是调用方失败时使用的 token 时才真正创建账号，
+        其余等待锁的调用直接复用新 token。
+        """
+        async with self._token_lock:
+            if self.access_token != stale_token:
+                return self.access_token
+            account = await self._request('createAccount', short_name=self.short_name)
+            token = account['access_token']
+            self.access_token = token
+            telegraph_config['access_token'] = token
+            logging.info(f"TELEGRAPH_ACCESS_TOKEN 已更新为: {token}")
+            # 写 .env 是同步文件操作，放到线程中执行
+            await asyncio.to_thread(update_env_variable, 'TELEGRAPH_ACCESS_TOKEN', token)
+            return token
+
+    def _retry_delay(self, error, retries):
+        # FLOOD_WAIT_n 表示需要等待 n 秒
+        message = str(error)
+        if message.startswith(FLOOD_WAIT_PREFIX):
+            try:
+                return float(message[len(FLOOD_WAIT_PREFIX):])
+            except ValueError:
+                pass
+        delay = min(self.max_delay, self.base_delay * 2 ** (retries - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def call(self, method, path='', max_retries=5, **values):
+        """
+        带重试的 Telegraph API 调用
+
+        :param method: API 方法名
+        :param path: 页面路径（getPage / editPage 使用）
+        :param max_retries: 最大重试次数
+        :return: API 返回的 result
+        """
+        retries = 0
+        rotated = False
+        while True:
+            token = self.access_token
+            try:
+                return await self._request(method, path, access_token=token, **values)
+            except (TelegraphError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                retries += 1
+                if retries >= max_retries:
+                    raise
+                logging.warning(f"Telegraph {method} 出错: {e}，重试第 {retries} 次")
+                if method == 'createPage' and not rotated and str(e) in TOKEN_ERRORS:
+                    rotated = True
+                    try:
+                        await self.rotate_token(token)
+                        continue
+                    except Exception as rotate_error:
+                        logging.error(f"更换 Telegraph token 失败: {rotate_error}")
+                await asyncio.sleep(self._retry_delay(e, retries))
+
+    async def create_page(self, title, content, author_name=None, author_url=None, max_retries=5):
+        return await self.call(
+            'createPage', max_retries=max_retries, title=title,
+            content=json.dumps(html_to_nodes(content), ensure_ascii=False),
+            author_name=author_name, author_url=author_url)
+
+    async def edit_page(self, path, title, content, author_name=None, author_url=None, max_retries=5):
+        return await self.call(
+            'editPage', path=path, max_retries=max_retries, title=title,
+            content=json.dumps(content if isinstance(content, list) else html_to_nodes(content),
+                               ensure_ascii=False),
+            author_name=author_name, author_url=author_url)
+
+    async def get_page(self, path, return_content=True):
+        return await self.call('getPage', path=path,
+                               return_content='true' if return_content else 'false')
+
+
+# 全局 Telegraph 客户端，首次使用时创建
+_client = None
+
+
+def get_client():
+    """
+    获取全局 Telegraph 客户端
+    """
+    global _client
+    if _client is None:
+        access_token = telegraph_config.get('access_token')
+        if not access_token:
+            logging.warning("未在配置中找到 TELEGRAPH_ACCESS_TOKEN 的配置，首次调用时将自动创建账号。")
+        _client = TelegraphClient(
+            access_token=access_token or None,
+            api_url=telegraph_config['api_url'],
+            short_name=telegraph_config['short_name'],
+            timeout=telegraph_config['timeout'],
+        )
+    return _client
+
+
+async def create_page(title, content, author_name="Default Author", author_url="https://example.com", max_retries=5):
     """
     创建一个新的 Telegraph 页面
     :param title: 页面标题
     :param content: 页面内容，HTML 格式的字符串
     :param author_name: 作者名称，默认为 "Default Author"
     :param author_url: 作者主页 URL，默认为 "https://example.com"
-    :param max_retries: 最大重试次数，默认为 3
+    :param max_retries: 最大重试次数，默认为 5
     :return: 页面的链接和页面 ID
     """
-    global telegraph
-    retries = 0
-    while retries < max_retries:
-        try:
-            response = telegraph.create_page(
-                title=title,
-                html_content=content,
-                author_name=author_name,
-                author_url=author_url
-            )
-            page_link = 'https://telegra.ph/{}'.format(response['path'])
-            page_id = response['path']
-            return page_link, page_id
-        except Exception as e:
-            print(f"创建页面时出错: {e}，重试第 {retries + 1} 次")
-            telegraph = Telegraph()
-            telegraph.create_account(short_name='meiseshow')
-            # telegraph.revoke_access_token()
-            token = telegraph.get_access_token()
-            print("TELEGRAPH_ACCESS_TOKEN 已更新为:", token)
-            update_env_variable('TELEGRAPH_ACCESS_TOKEN', token)
-            telegraph_config['access_token'] = token
-            retries += 1
-    print("达到最大重试次数，创建页面失败。")
-    return None, None
+    try:
+        response = await get_client().create_page(title, content, author_name, author_url, max_retries)
+    except Exception as e:
+        logging.error(f"达到最大重试次数，创建页面失败: {e}")
+        return None, None
+    page_link = 'https://telegra.ph/{}'.format(response['path'])
+    page_id = response['path']
+    return page_link, page_id
 
 
-def edit_page(page_id, title, content, author_name="Default Author", author_url="https://example.com"):
+async def edit_page(page_id, title, content, author_name="Default Author", author_url="https://example.com"):
     """
     编辑已有的 Telegraph 页面
     :param page_id: 页面的 ID
@@ -69,42 +249,38 @@ def edit_page(page_id, title, content, author_name="Default Author", author_url=
     :param author_url: 作者主页 URL，默认为 "https://example.com"
     :return: 页面的链接
     """
-    response = telegraph.edit_page(
-        path=page_id,
-        title=title,
-        html_content=content,
-        author_name=author_name,
-        author_url=author_url
-    )
+    response = await get_client().edit_page(page_id, title, content, author_name, author_url)
     return 'https://telegra.ph/{}'.format(response['path'])
 
 
-def publish_rss_item(item, author_name, author_url):
+async def publish_rss_item(item, author_name, author_url):
     """
-    根据 RSS Feed 中的单个 item 发布一篇 Telegraph 文章
-    :param item: RSS Feed 中的单个 item，包含标题、描述、发布日期等
+    根据 RSS Feed 中的单个 item 发布一篇 Telegraph 文章，文章只包含描述中的图片
+    :param item: NormalizedItem，也可以传入未归一化的 FeedItem
     :return: 页面的链接和页面 ID
     """
-    title = item.title
-    description = item.description
-    pub_date = item.pubDate
+    if not isinstance(item, NormalizedItem):
+        item = normalize(item)
 
-    # 解析描述中的图片地址
-    image_urls = re.findall(r'<img[^>]+src="([^">]+)"', description)
-    telegraph_image_urls = []
-    for img_url in image_urls:
-        telegraph_img_url = img_url
-        if telegraph_img_url:
-            telegraph_image_urls.append(telegraph_img_url)
+    async def create():
+        response = await get_client().create_page(item.title, item.page_html, author_name, author_url)
+        return response['path']
 
-    # 构建文章内容，仅包含上传后图片新地址列表
-    content = ""
-    for img_url in telegraph_image_urls:
-        content += f'<img src="{img_url}" />'
+    # 内容相同的页面直接复用，不再调用 Telegraph
+    try:
+        cache = get_page_cache()
+    except RuntimeError:
+        return await create_page(item.title, item.page_html, author_name, author_url)
+    key = page_key(item.title, item.image_urls, author_name, author_url)
+    try:
+        page_id = await cache.get_or_create(key, create)
+    except Exception as e:
+        logging.error(f"达到最大重试次数，创建页面失败: {e}")
+        return None, None
+    return 'https://telegra.ph/{}'.format(page_id), page_id
 
-    return create_page(title, content, author_name, author_url)
 
-def get_file_path(file_id, token):
+async def get_file_path(file_id, token):
     """
     根据 file_id 获取文件的下载路径
     :param file_id: 图片的 file_id
@@ -114,22 +290,24 @@ def get_file_path(file_id, token):
     params = {
         "file_id": file_id
     }
-    response = requests.get(url, params=params)
-    result = response.json()
+    async with get_session().get(url, params=params) as response:
+        result = await response.json(content_type=None)
     if result.get('ok'):
         return result['result']['file_path']
     return None
 
-def add_links_to_page(page_id, links):
+
+async def add_links_to_page(page_id, links):
     """
     给指定的 Telegraph 页面添加多条链接
     :param page_id: 页面的 ID
     :param links: 链接列表，每个链接是一个字典，包含 'title' 和 'url' 键
     :return: 页面的链接
     """
+    client = get_client()
     # 获取当前页面内容
-    response = telegraph.get_page(page_id, return_content=True)
-    current_content = response.get('content', '')
+    response = await client.get_page(page_id, return_content=True)
+    current_content = response.get('content', [])
 
     # 构建链接 HTML 内容
     link_html = ""
@@ -138,31 +316,29 @@ def add_links_to_page(page_id, links):
         url = link.get('url', '')
         link_html += f'<a href="{url}">{title}</a><br/>'
 
-    # 将链接 HTML 内容添加到当前内容中
-    new_content = current_content + link_html
+    # 将链接节点追加到当前内容中
+    new_content = current_content + html_to_nodes(link_html)
 
     # 编辑页面内容
-    updated_response = telegraph.edit_page(
-        path=page_id,
+    updated_response = await client.edit_page(
+        page_id,
         title=response['title'],
-        html_content=new_content,  # 使用 html_content 参数
-        author_name=response['author_name'],
-        author_url=response['author_url']
+        content=new_content,
+        author_name=response.get('author_name'),
+        author_url=response.get('author_url')
     )
     return 'https://telegra.ph/{}'.format(updated_response['path'])
 
 
-if __name__ == "__main__":
+async def main():
+    access_token = telegraph_config.get('access_token')
     if not access_token:
         print("由于未配置 TELEGRAPH_ACCESS_TOKEN，无法进行页面创建和编辑操作，请先配置。")
     else:
         print(f"使用配置中的 access_token: {access_token}")
 
         # 示例：创建一个新页面
-        # telegraph.revoke_access_token()
-        # print(telegraph.get_access_token())
-        # telegraph = Telegraph(access_token=access_token)
-        link, _ = create_page("美色秀导航",'<a href="{url}">{title}</a><br/>')
+        link, _ = await create_page("美色秀导航",'<a href="{url}">{title}</a><br/>')
         print(f"页面已创建，链接为: {link}")
 
         # 示例链接列表
@@ -171,7 +347,7 @@ if __name__ == "__main__":
         # {"title": "[Xiuren秀人网] 2025.03.03 NO.9960 唐安琪[83P]", "url": "https://telegra.ph/Xiuren秀人网-20250303-NO9960-唐安琪83P-03-20-2"},
         # {"title": "[Xiuren秀人网] 2025.03.03 NO.9958 玥儿玥er[86P]", "url": "https://telegra.ph/Xiuren秀人网-20250303-NO9958-玥儿玥er86P-03-20-2"}
         # ]
-        # add_links_to_page(page_id, links)
+        # await add_links_to_page(page_id, links)
 
         # # 示例 RSS item
         # rss_item = FeedItem(
@@ -181,26 +357,17 @@ if __name__ == "__main__":
         #     link='https://t.me/'
         # )
 
-        # page_link, page_id = publish_rss_item(rss_item, "Default", "https://t.me")
+        # page_link, page_id = await publish_rss_item(rss_item, "Default", "https://t.me")
         # print(f"文章已发布到 Telegraph，链接为: {page_link}，页面 ID 为: {page_id}")
 
         # telegram_token = str(telegram_config['token'])
-        # url = f"https://api.telegram.org/bot{telegram_token}/sendPhoto"
-        # params = {
-        #     "chat_id": "7266351024",
-        #     "photo": "https://y.gtimg.cn/music/photo_new/T053M000001ME2bp095ikV.jpg",
-        #     "caption": "This is a sample image"
-        # }
-        # response = requests.post(url, data=params)
-        # response_info = response.json()
-        # print(response_info)
-        # # 获取第一个图片的 file_id
-        # first_file_id = response_info['result']['photo'][-1]['file_id']
-        # print(first_file_id)
-
-        # # 获取文件的下载路径
-        # file_path = get_file_path(first_file_id, telegram_token)
+        # file_path = await get_file_path(first_file_id, telegram_token)
         # real_url = f"https://api.telegram.org/file/bot{telegram_token}/{file_path}"
 
         # print(real_url)
 
+    await close_session()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
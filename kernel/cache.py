@@ -0,0 +1,96 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class AsyncTTLCache:
+    """
+    带过期时间的异步缓存
+
+    同一 key 的并发加载只会执行一次，其余调用等待同一个结果。
+    超过容量时淘汰最久未使用的记录。
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._pending: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def peek(self, key: Hashable) -> Any:
+        """
+        读取未过期的缓存值，不存在时返回 None，不计入统计
+        """
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def invalidate_if(self, predicate: Callable[[Hashable, Any], bool]):
+        """
+        删除所有满足 predicate(key, value) 的记录
+        """
+        for key in [key for key, (_, value) in self._data.items() if predicate(key, value)]:
+            del self._data[key]
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            self.set(key, value)
+            return value
+        finally:
+            self._pending.pop(key, None)
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        读取缓存，未命中或已过期时调用 loader 加载
+
+        Args:
+            key: 缓存 key
+            loader: 无参协程函数，返回要缓存的值；抛出异常时不缓存
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.hits += 1
+                self._data.move_to_end(key)
+                return entry[1]
+            del self._data[key]
+
+        task = self._pending.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, loader))
+            # 所有等待者都被取消时，避免出现未读取异常的警告
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._pending[key] = task
+        else:
+            self.coalesced += 1
+        # shield 保证单个调用方被取消时不会中断共享的加载
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        缓存命中统计
+        """
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
@@ -1,10 +1,28 @@
 from dotenv import load_dotenv, set_key
 import os
+import socket
 
 load_dotenv()
 
 telegram_config = {
     'token': os.environ.get('TELEGRAM_BOT_TOKEN', ''),
+    # Bot API 地址，使用自建 Bot API 服务器或测试时修改
+    'base_url': os.environ.get('TG_BASE_URL', 'https://api.telegram.org/bot'),
+    'base_file_url': os.environ.get('TG_BASE_FILE_URL', 'https://api.telegram.org/file/bot'),
+    # 每个 bot 的全局发送速率（条/秒）和突发上限
+    'bot_rate': float(os.environ.get('TG_BOT_RATE', 25)),
+    'bot_burst': float(os.environ.get('TG_BOT_BURST', 25)),
+    # 每个 chat 的发送速率（条/分钟）和突发上限
+    'chat_rate': float(os.environ.get('TG_CHAT_RATE', 20)) / 60,
+    'chat_burst': float(os.environ.get('TG_CHAT_BURST', 3)),
+    # 收到 RetryAfter 后的最大重试次数
+    'send_retries': int(os.environ.get('TG_SEND_RETRIES', 3)),
+    # 频道信息与管理员状态缓存的有效期（秒）和容量
+    'chat_cache_ttl': float(os.environ.get('TG_CHAT_CACHE_TTL', 600)),
+    'chat_cache_size': int(os.environ.get('TG_CHAT_CACHE_SIZE', 10000)),
+    # 图片 file_id 缓存的内存容量，以及数据库记录的保留天数（超过后定期清理）
+    'file_id_cache_size': int(os.environ.get('TG_FILE_ID_CACHE_SIZE', 10000)),
+    'file_id_cache_days': float(os.environ.get('TG_FILE_ID_CACHE_DAYS', 30)),
 }
 
 discord_config = {
@@ -17,13 +35,137 @@ db_config = {
     'user': os.environ.get('MYSQL_USER', 'root'),
     'password': os.environ.get('MYSQL_PASS', ''),
     'database': os.environ.get('MYSQL_DATABASE', 'telegram_bot'),
+    # 连接池大小（同时也是数据库线程池大小）
+    'pool_size': int(os.environ.get('MYSQL_POOL_SIZE', 5)),
+    # 订阅时间戳批量写入的间隔（秒）和条数阈值
+    'flush_interval': float(os.environ.get('MYSQL_FLUSH_INTERVAL', 5)),
+    'flush_size': int(os.environ.get('MYSQL_FLUSH_SIZE', 100)),
+}
+
+# 订阅轮询配置
+scheduler_config = {
+    # 首次轮询前的等待时间（秒）
+    'startup_delay': int(os.environ.get('POLL_STARTUP_DELAY', 4 * 60)),
+    # 新 feed 的初始轮询间隔（秒），之后根据发布频率自动调整
+    'interval': int(os.environ.get('POLL_INTERVAL', 4 * 60 * 60)),
+    # 自适应轮询间隔的上下限（秒）
+    'min_interval': int(os.environ.get('POLL_MIN_INTERVAL', 15 * 60)),
+    'max_interval': int(os.environ.get('POLL_MAX_INTERVAL', 24 * 60 * 60)),
+    # 轮询时间的随机抖动比例
+    'jitter': float(os.environ.get('POLL_JITTER', 0.1)),
+    # 调度器最长休眠时间（秒），用于发现新增订阅
+    'tick': int(os.environ.get('POLL_TICK', 60)),
+    # 调度模式：local 为单进程内存调度，lease 为多个 worker 通过数据库租约共享订阅
+    'mode': os.environ.get('POLL_MODE', 'local'),
+    # lease 模式下的 worker 标识、租约时长（秒）和每次领取的 feed 数量
+    'worker_id': os.environ.get('WORKER_ID', f"{socket.gethostname()}:{os.getpid()}"),
+    'lease_seconds': int(os.environ.get('POLL_LEASE_SECONDS', 300)),
+    'claim_batch': int(os.environ.get('POLL_CLAIM_BATCH', 50)),
+    # 全局并发上限
+    'concurrency': int(os.environ.get('POLL_CONCURRENCY', 16)),
+    # 单个域名的并发上限
+    'per_host_concurrency': int(os.environ.get('POLL_PER_HOST_CONCURRENCY', 2)),
+}
+
+# 出站 HTTP 配置
+http_config = {
+    # 连接池总连接数上限
+    'limit': int(os.environ.get('HTTP_POOL_LIMIT', 100)),
+    # 单个域名的连接数上限
+    'limit_per_host': int(os.environ.get('HTTP_POOL_LIMIT_PER_HOST', 4)),
+    # DNS 缓存时间（秒）
+    'dns_cache_ttl': int(os.environ.get('HTTP_DNS_CACHE_TTL', 600)),
+    # 空闲连接保持时间（秒）
+    'keepalive_timeout': float(os.environ.get('HTTP_KEEPALIVE_TIMEOUT', 60)),
+    'connect_timeout': float(os.environ.get('HTTP_CONNECT_TIMEOUT', 10)),
+    'read_timeout': float(os.environ.get('HTTP_READ_TIMEOUT', 30)),
+    'total_timeout': float(os.environ.get('HTTP_TOTAL_TIMEOUT', 60)),
+}
+
+# feed 解析配置
+parse_config = {
+    # 解析进程数，0 表示在事件循环线程中直接解析
+    'workers': int(os.environ.get('PARSE_WORKERS', 2)),
+    # 小于该字节数的内容直接解析，避免进程间传输的开销
+    'inline_max_bytes': int(os.environ.get('PARSE_INLINE_MAX_BYTES', 32 * 1024)),
+    # 流式解析：边下载边解析，越过所有订阅的 watermark 后停止读取，默认关闭
+    'streaming': os.environ.get('PARSE_STREAMING', 'false').lower() in ('1', 'true', 'yes'),
+    # 流式解析时最多读取的字节数
+    'max_bytes': int(os.environ.get('PARSE_MAX_BYTES', 16 * 1024 * 1024)),
+}
+
+# feed 熔断配置：连续失败达到阈值后熔断，只用 HEAD 探测，退避间隔按失败次数指数增长
+health_config = {
+    'threshold': int(os.environ.get('FEED_BREAKER_THRESHOLD', 3)),
+    # 退避间隔的初始值和上限（秒）
+    'base_delay': float(os.environ.get('FEED_BACKOFF_BASE', 600)),
+    'max_delay': float(os.environ.get('FEED_BACKOFF_MAX', 86400)),
+    # 探测请求超时（秒）
+    'probe_timeout': float(os.environ.get('FEED_PROBE_TIMEOUT', 10)),
+}
+
+# 已处理条目索引的内存 LRU 容量
+seen_config = {
+    'cache_size': int(os.environ.get('SEEN_CACHE_SIZE', 100000)),
 }
 
 # Telegraph 配置
 telegraph_config = {
-    'access_token': os.environ.get('TELEGRAPH_ACCESS_TOKEN', '')
+    'access_token': os.environ.get('TELEGRAPH_ACCESS_TOKEN', ''),
+    'api_url': os.environ.get('TELEGRAPH_API_URL', 'https://api.telegra.ph'),
+    # token 失效时自动创建账号使用的名称
+    'short_name': os.environ.get('TELEGRAPH_SHORT_NAME', 'meiseshow'),
+    # 单次请求超时（秒）
+    'timeout': float(os.environ.get('TELEGRAPH_TIMEOUT', 30)),
+    # 页面缓存的有效期（天）和内存容量，内容相同的页面在有效期内直接复用
+    'page_cache_days': float(os.environ.get('TELEGRAPH_PAGE_CACHE_DAYS', 30)),
+    'page_cache_size': int(os.environ.get('TELEGRAPH_PAGE_CACHE_SIZE', 10000)),
+    # /pub 批量发布时同时创建的页面数量
+    'concurrency': int(os.environ.get('TELEGRAPH_CONCURRENCY', 4)),
 }
 
+# 事件循环配置，USE_UVLOOP=true 时使用 uvloop（需要安装 uvloop）
+runtime_config = {
+    'uvloop': os.environ.get('USE_UVLOOP', 'false').lower() in ('1', 'true', 'yes'),
+}
+
+# 接收 bot 更新的方式：polling（默认，每个 bot 长轮询）或 webhook（所有 bot 共用一个 HTTP 服务）
+webhook_config = {
+    'enabled': os.environ.get('TG_UPDATE_MODE', 'polling').lower() == 'webhook',
+    # Telegram 可访问的公网地址，例如 https://bot.example.com，推送地址为 <url>/webhook/<bot id>
+    'url': os.environ.get('TG_WEBHOOK_URL', '').rstrip('/'),
+    # 本地监听地址，通常由反向代理转发 HTTPS 请求
+    'host': os.environ.get('TG_WEBHOOK_HOST', '127.0.0.1'),
+    'port': int(os.environ.get('TG_WEBHOOK_PORT', 8080)),
+}
+
+# 指标 HTTP 服务（Prometheus 文本格式），默认关闭
+metrics_config = {
+    'enabled': os.environ.get('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+    'host': os.environ.get('METRICS_HOST', '127.0.0.1'),
+    'port': int(os.environ.get('METRICS_PORT', 9108)),
+}
+
+# 投递队列配置
+outbox_config = {
+    # 同时发送的条目数
+    'workers': int(os.environ.get('OUTBOX_WORKERS', 8)),
+    # 每次领取的条目数
+    'batch_size': int(os.environ.get('OUTBOX_BATCH_SIZE', 20)),
+    # 领取后的租约时长（秒），超时未完成的条目可被重新领取
+    'lease_seconds': int(os.environ.get('OUTBOX_LEASE_SECONDS', 600)),
+    # 最大尝试次数，超过后进入死信
+    'max_attempts': int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8)),
+    # 重试的初始间隔和最大间隔（秒），按指数增长
+    'base_delay': float(os.environ.get('OUTBOX_BASE_DELAY', 30)),
+    'max_delay': float(os.environ.get('OUTBOX_MAX_DELAY', 3600)),
+    # 队列为空时的检查间隔（秒）
+    'idle_interval': float(os.environ.get('OUTBOX_IDLE_INTERVAL', 5)),
+    # 已投递记录的保留天数
+    'retention_days': int(os.environ.get('OUTBOX_RETENTION_DAYS', 7)),
+}
+
+
 def update_env_variable(key, value):
     """
     此方法用于更新 .env 文件中的环境变量
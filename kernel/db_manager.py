@@ -1,7 +1,76 @@
 import mysql.connector
+import asyncio
+import functools
 import logging
-from datetime import datetime
-from typing import List, Dict, Tuple, Optional, Any
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Tuple, Optional, Any, Callable
+
+from kernel.metrics import DB_QUERY_SECONDS
+
+# 批量查询时每条语句包含的最大参数数量
+BATCH_SIZE = 500
+
+
+class ConnectionPool:
+    """
+    简单的数据库连接池
+
+    连接按需创建并在归还后复用，并发数量由使用方（线程池大小）约束。
+    连接断开时由调用方丢弃并重新获取，不在每次使用前做 is_connected() 检查。
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self._idle = queue.LifoQueue()
+
+    def connect(self):
+        """
+        创建新的数据库连接
+        """
+        try:
+            conn = mysql.connector.connect(**self.config)
+            logging.info("Database connection established")
+            return conn
+        except mysql.connector.Error as err:
+            logging.error(f"Database connection error: {err}")
+            raise
+
+    def acquire(self):
+        """
+        获取一个连接，优先复用空闲连接
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, conn):
+        """
+        归还连接
+        """
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        """
+        丢弃已失效的连接
+        """
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """
+        关闭所有空闲连接
+        """
+        while True:
+            try:
+                self.discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
 
 
 class DBManager:
@@ -11,7 +80,7 @@ class DBManager:
 
     def __init__(self, host: str, user: str, password: str, database: str):
         """
-        初始化数据库连接
+        初始化数据库连接池
         """
         self.config = {
             'host': host,
@@ -19,55 +88,188 @@ class DBManager:
             'password': password,
             'database': database
         }
-        self.conn = None
-        self.connect()
+        self.pool = ConnectionPool(self.config)
         self.init_tables()
 
-    def connect(self):
+    def _run(self, work: Callable, dictionary: bool = False) -> Any:
         """
-        连接到数据库
+        从连接池取出连接执行 work(conn, cursor)
+
+        连接已断开时丢弃该连接并用新连接重试一次。
         """
-        try:
-            self.conn = mysql.connector.connect(**self.config)
-            logging.info("Database connection established")
-        except mysql.connector.Error as err:
-            logging.error(f"Database connection error: {err}")
-            raise
+        for attempt in range(2):
+            conn = self.pool.acquire()
+            try:
+                cursor = conn.cursor(dictionary=dictionary)
+                try:
+                    result = work(conn, cursor)
+                finally:
+                    cursor.close()
+            except (mysql.connector.OperationalError, mysql.connector.InterfaceError) as e:
+                self.pool.discard(conn)
+                if attempt:
+                    raise
+                logging.warning(f"Database connection lost, reconnecting: {e}")
+                continue
+            except Exception:
+                self._reset(conn)
+                raise
+            self._reset(conn)
+            return result
 
-    def ensure_connection(self):
+    def _reset(self, conn):
         """
-        确保数据库连接有效
+        结束连接上未提交的事务（只读查询的快照）后归还连接池
         """
         try:
-            if self.conn is None or not self.conn.is_connected():
-                self.connect()
-        except Exception as e:
-            logging.error(f"Error reconnecting to database: {e}")
-            raise
+            if conn.in_transaction:
+                conn.rollback()
+        except mysql.connector.Error:
+            self.pool.discard(conn)
+            return
+        self.pool.release(conn)
+
+    def _ensure_column(self, cursor, table: str, column: str, definition: str):
+        """
+        表中缺少指定字段时添加该字段
+        """
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+            (table, column)
+        )
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logging.info(f"Added column {table}.{column}")
+
+    def _ensure_index(self, cursor, table: str, index: str, columns: str):
+        """
+        表中缺少指定索引时添加该索引
+        """
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+            (table, index)
+        )
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns})")
+            logging.info(f"Added index {table}.{index}")
 
     def init_tables(self):
         """
         初始化数据库表
         """
-        self.ensure_connection()
-        cursor = self.conn.cursor()
-
-        # 创建频道订阅表
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS channel_subscriptions (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            channel_id BIGINT NOT NULL,
-            channel_name VARCHAR(255) NOT NULL,
-            feed_url VARCHAR(512) NOT NULL,
-            is_active BOOLEAN NOT NULL DEFAULT TRUE,
-            created_at DATETIME NOT NULL,
-            updated_at DATETIME NOT NULL,
-            UNIQUE KEY unique_channel_feed (channel_id, feed_url)
-        )
-        ''')
+        def work(conn, cursor):
+            # 创建频道订阅表
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS channel_subscriptions (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                channel_id BIGINT NOT NULL,
+                channel_name VARCHAR(255) NOT NULL,
+                feed_url VARCHAR(512) NOT NULL,
+                is_active BOOLEAN NOT NULL DEFAULT TRUE,
+                created_at DATETIME NOT NULL,
+                updated_at DATETIME NOT NULL,
+                UNIQUE KEY unique_channel_feed (channel_id, feed_url)
+            )
+            ''')
+
+            # 创建 feed 条件请求缓存表
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS feed_cache (
+                feed_url VARCHAR(512) NOT NULL PRIMARY KEY,
+                etag VARCHAR(255) NULL,
+                last_modified VARCHAR(64) NULL,
+                body_hash CHAR(40) NULL,
+                updated_at DATETIME NOT NULL
+            )
+            ''')
+
+            # 创建 feed 健康状态表，只保存最近抓取失败的 feed
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS feed_health (
+                feed_url VARCHAR(512) NOT NULL PRIMARY KEY,
+                failures INT NOT NULL,
+                last_error VARCHAR(255) NULL,
+                next_attempt DATETIME NOT NULL,
+                updated_at DATETIME NOT NULL
+            )
+            ''')
+
+            # 创建 feed 轮询计划表
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS feed_schedule (
+                feed_url VARCHAR(512) NOT NULL PRIMARY KEY,
+                interval_seconds INT NOT NULL,
+                next_poll_at DATETIME NOT NULL,
+                last_item_at DATETIME NULL,
+                lease_owner VARCHAR(128) NULL,
+                lease_expires_at DATETIME NULL,
+                updated_at DATETIME NOT NULL,
+                KEY idx_next_poll (next_poll_at)
+            )
+            ''')
+            # 旧版本的轮询计划表没有租约字段
+            self._ensure_column(cursor, 'feed_schedule', 'lease_owner', 'VARCHAR(128) NULL')
+            self._ensure_column(cursor, 'feed_schedule', 'lease_expires_at', 'DATETIME NULL')
+
+            # 创建已处理条目表，item_hash 为 guid/link 的 64 位哈希
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS seen_items (
+                subscription_id INT NOT NULL,
+                item_hash BIGINT NOT NULL,
+                created_at DATETIME NOT NULL,
+                PRIMARY KEY (subscription_id, item_hash)
+            )
+            ''')
+
+            # 创建 Telegram file_id 缓存表，file_id 只对上传它的 bot 有效
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS telegram_file_ids (
+                bot_id BIGINT NOT NULL,
+                url_hash CHAR(40) NOT NULL,
+                file_id VARCHAR(255) NOT NULL,
+                updated_at DATETIME NOT NULL,
+                PRIMARY KEY (bot_id, url_hash),
+                KEY idx_updated (updated_at)
+            )
+            ''')
+            self._ensure_index(cursor, 'telegram_file_ids', 'idx_updated', 'updated_at')
+
+            # 创建 Telegraph 页面缓存表，content_hash 为标题、图片和作者的 SHA-1
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS telegraph_pages (
+                content_hash CHAR(40) PRIMARY KEY,
+                path VARCHAR(255) NOT NULL,
+                created_at DATETIME NOT NULL,
+                KEY idx_created (created_at)
+            )
+            ''')
+
+            # 创建投递队列表，(subscription_id, item_hash) 作为幂等键
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS delivery_outbox (
+                id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                subscription_id INT NOT NULL,
+                item_hash BIGINT NOT NULL,
+                payload MEDIUMTEXT NOT NULL,
+                page_link VARCHAR(512) NULL,
+                status VARCHAR(16) NOT NULL DEFAULT 'pending',
+                attempts INT NOT NULL DEFAULT 0,
+                next_attempt_at DATETIME NOT NULL,
+                last_error TEXT NULL,
+                lease_owner VARCHAR(128) NULL,
+                lease_expires_at DATETIME NULL,
+                created_at DATETIME NOT NULL,
+                updated_at DATETIME NOT NULL,
+                UNIQUE KEY uk_subscription_item (subscription_id, item_hash),
+                KEY idx_status_next (status, next_attempt_at)
+            )
+            ''')
 
-        self.conn.commit()
-        cursor.close()
+            conn.commit()
+
+        self._run(work)
         logging.info("Database tables initialized")
 
     def add_subscription(self, channel_id: int, channel_name: str, feed_url: str) -> int:
@@ -82,11 +284,9 @@ class DBManager:
         Returns:
             subscription_id: 新添加的订阅 ID
         """
-        self.ensure_connection()
-        cursor = self.conn.cursor()
         now = datetime.now()
 
-        try:
+        def work(conn, cursor):
             # 检查是否已存在相同订阅
             cursor.execute(
                 "SELECT id FROM channel_subscriptions WHERE channel_id = %s AND feed_url = %s",
@@ -100,7 +300,7 @@ class DBManager:
                     "UPDATE channel_subscriptions SET is_active = TRUE WHERE id = %s",
                     (existing[0],)
                 )
-                self.conn.commit()
+                conn.commit()
                 return existing[0]
             else:
                 # 添加新订阅
@@ -109,10 +309,10 @@ class DBManager:
                     (channel_id, channel_name, feed_url, now,
                      datetime.fromtimestamp(0))  # 初始化为最小时间
                 )
-                self.conn.commit()
+                conn.commit()
                 return cursor.lastrowid
-        finally:
-            cursor.close()
+
+        return self._run(work)
 
     def remove_subscription(self, channel_id: int, feed_url: str) -> bool:
         """
@@ -125,19 +325,16 @@ class DBManager:
         Returns:
             success: 是否成功取消订阅
         """
-        self.ensure_connection()
-        cursor = self.conn.cursor()
-
-        try:
+        def work(conn, cursor):
             # 将is_active设为False而不是删除记录
             cursor.execute(
                 "UPDATE channel_subscriptions SET is_active = FALSE WHERE channel_id = %s AND feed_url = %s",
                 (channel_id, feed_url)
             )
-            self.conn.commit()
+            conn.commit()
             return cursor.rowcount > 0
-        finally:
-            cursor.close()
+
+        return self._run(work)
 
     def update_subscription_timestamp(self, subscription_id: int, pub_date: datetime) -> bool:
         """
@@ -150,18 +347,45 @@ class DBManager:
         Returns:
             success: 是否成功更新
         """
-        self.ensure_connection()
-        cursor = self.conn.cursor()
-
-        try:
+        def work(conn, cursor):
             cursor.execute(
                 "UPDATE channel_subscriptions SET updated_at = %s WHERE id = %s",
                 (pub_date, subscription_id)
             )
-            self.conn.commit()
+            conn.commit()
             return cursor.rowcount > 0
-        finally:
-            cursor.close()
+
+        return self._run(work)
+
+    def update_subscription_timestamps(self, updates: Dict[int, datetime]) -> int:
+        """
+        批量更新多个订阅的时间戳，时间戳只会前进不会后退
+
+        Args:
+            updates: 订阅 ID 到消息发布时间的映射
+
+        Returns:
+            count: 实际更新的记录数
+        """
+        def work(conn, cursor):
+            items = list(updates.items())
+            count = 0
+            for start in range(0, len(items), BATCH_SIZE):
+                batch = items[start:start + BATCH_SIZE]
+                cases = ' '.join(['WHEN %s THEN %s'] * len(batch))
+                placeholders = ', '.join(['%s'] * len(batch))
+                params = [value for pair in batch for value in pair]
+                params.extend(subscription_id for subscription_id, _ in batch)
+                cursor.execute(
+                    f"UPDATE channel_subscriptions SET updated_at = GREATEST(updated_at, CASE id {cases} END) "
+                    f"WHERE id IN ({placeholders})",
+                    params
+                )
+                count += cursor.rowcount
+            conn.commit()
+            return count
+
+        return self._run(work)
 
     def get_subscriptions(self, channel_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """
@@ -173,10 +397,7 @@ class DBManager:
         Returns:
             subscriptions: 订阅列表
         """
-        self.ensure_connection()
-        cursor = self.conn.cursor(dictionary=True)
-
-        try:
+        def work(conn, cursor):
             if channel_id:
                 cursor.execute(
                     "SELECT * FROM channel_subscriptions WHERE channel_id = %s AND is_active = TRUE",
@@ -187,8 +408,8 @@ class DBManager:
                     "SELECT * FROM channel_subscriptions WHERE is_active = TRUE")
 
             return cursor.fetchall()
-        finally:
-            cursor.close()
+
+        return self._run(work, dictionary=True)
 
     def get_subscription_timestamp(self, channel_id: int, feed_url: str) -> Optional[datetime]:
         """
@@ -201,43 +422,813 @@ class DBManager:
         Returns:
             datetime: 更新时间戳，如果不存在返回None
         """
-        self.ensure_connection()
-        cursor = self.conn.cursor()
-
-        try:
+        def work(conn, cursor):
             cursor.execute(
                 "SELECT updated_at FROM channel_subscriptions WHERE channel_id = %s AND feed_url = %s",
                 (channel_id, feed_url)
             )
             result = cursor.fetchone()
             return result[0] if result else None
-        finally:
-            cursor.close()
+
+        return self._run(work)
+
+    def get_feed_cache(self, feed_url: str) -> Optional[Dict[str, Any]]:
+        """
+        获取 feed 的条件请求缓存
+
+        Args:
+            feed_url: 订阅的 URL
+
+        Returns:
+            cache: 包含 etag、last_modified、body_hash 的字典，不存在返回None
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "SELECT etag, last_modified, body_hash FROM feed_cache WHERE feed_url = %s",
+                (feed_url,)
+            )
+            return cursor.fetchone()
+
+        return self._run(work, dictionary=True)
+
+    def delete_feed_cache(self, feed_url: str) -> bool:
+        """
+        删除 feed 的条件请求缓存，下一次轮询完整抓取
+        """
+        def work(conn, cursor):
+            cursor.execute("DELETE FROM feed_cache WHERE feed_url = %s", (feed_url,))
+            conn.commit()
+            return cursor.rowcount > 0
+
+        return self._run(work)
+
+    def save_feed_cache(self, feed_url: str, etag: Optional[str], last_modified: Optional[str],
+                        body_hash: Optional[str]) -> bool:
+        """
+        保存 feed 的条件请求缓存
+
+        Args:
+            feed_url: 订阅的 URL
+            etag: 响应头 ETag
+            last_modified: 响应头 Last-Modified
+            body_hash: 响应内容的 SHA-1
+
+        Returns:
+            success: 是否成功保存
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "INSERT INTO feed_cache (feed_url, etag, last_modified, body_hash, updated_at) "
+                "VALUES (%s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE etag = VALUES(etag), last_modified = VALUES(last_modified), "
+                "body_hash = VALUES(body_hash), updated_at = VALUES(updated_at)",
+                (feed_url, etag, last_modified, body_hash, datetime.now())
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+        return self._run(work)
+
+    def get_feed_health(self, feed_url: str) -> Optional[Dict[str, Any]]:
+        """
+        获取 feed 的健康状态
+
+        Returns:
+            health: 包含 failures、last_error、next_attempt 的字典，feed 健康时返回None
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "SELECT failures, last_error, next_attempt FROM feed_health WHERE feed_url = %s",
+                (feed_url,)
+            )
+            return cursor.fetchone()
+
+        return self._run(work, dictionary=True)
+
+    def get_feed_healths(self, feed_urls: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批量获取 feed 的健康状态，只返回有失败记录的 feed
+        """
+        def work(conn, cursor):
+            if not feed_urls:
+                return {}
+            placeholders = ', '.join(['%s'] * len(feed_urls))
+            cursor.execute(
+                f"SELECT feed_url, failures, last_error, next_attempt FROM feed_health "
+                f"WHERE feed_url IN ({placeholders})",
+                tuple(feed_urls)
+            )
+            return {row['feed_url']: row for row in cursor.fetchall()}
+
+        return self._run(work, dictionary=True)
+
+    def save_feed_health(self, feed_url: str, failures: int, last_error: str, next_attempt: datetime) -> bool:
+        """
+        保存 feed 的失败次数、最近的错误和下一次允许抓取的时间
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "INSERT INTO feed_health (feed_url, failures, last_error, next_attempt, updated_at) "
+                "VALUES (%s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE failures = VALUES(failures), last_error = VALUES(last_error), "
+                "next_attempt = VALUES(next_attempt), updated_at = VALUES(updated_at)",
+                (feed_url, failures, last_error, next_attempt, datetime.now())
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+        return self._run(work)
+
+    def delete_feed_health(self, feed_url: str) -> bool:
+        """
+        清除 feed 的失败记录
+        """
+        def work(conn, cursor):
+            cursor.execute("DELETE FROM feed_health WHERE feed_url = %s", (feed_url,))
+            conn.commit()
+            return cursor.rowcount > 0
+
+        return self._run(work)
+
+    def get_feed_schedules(self) -> List[Dict[str, Any]]:
+        """
+        获取所有 feed 的轮询计划
+
+        Returns:
+            schedules: 轮询计划列表
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "SELECT feed_url, interval_seconds, next_poll_at, last_item_at FROM feed_schedule")
+            return cursor.fetchall()
+
+        return self._run(work, dictionary=True)
+
+    def save_feed_schedule(self, feed_url: str, interval_seconds: int, next_poll_at: datetime,
+                           last_item_at: Optional[datetime]) -> bool:
+        """
+        保存 feed 的轮询计划
+
+        Args:
+            feed_url: 订阅的 URL
+            interval_seconds: 当前轮询间隔（秒）
+            next_poll_at: 下一次轮询时间
+            last_item_at: 已知最新条目的发布时间
+
+        Returns:
+            success: 是否成功保存
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "INSERT INTO feed_schedule (feed_url, interval_seconds, next_poll_at, last_item_at, updated_at) "
+                "VALUES (%s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE interval_seconds = VALUES(interval_seconds), "
+                "next_poll_at = VALUES(next_poll_at), last_item_at = VALUES(last_item_at), "
+                "updated_at = VALUES(updated_at)",
+                (feed_url, interval_seconds, next_poll_at, last_item_at, datetime.now())
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+        return self._run(work)
+
+    def sync_feed_schedules(self, default_interval: int) -> int:
+        """
+        为还没有轮询计划的已订阅 feed 创建立即到期的计划
+
+        Args:
+            default_interval: 初始轮询间隔（秒）
+
+        Returns:
+            count: 新创建的计划数
+        """
+        now = datetime.now()
+
+        def work(conn, cursor):
+            cursor.execute(
+                "INSERT IGNORE INTO feed_schedule (feed_url, interval_seconds, next_poll_at, updated_at) "
+                "SELECT DISTINCT feed_url, %s, %s, %s FROM channel_subscriptions WHERE is_active = TRUE",
+                (default_interval, now, now)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(work)
+
+    def claim_due_feeds(self, owner: str, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        """
+        领取到期且未被其他 worker 持有租约的 feed
+
+        使用 SELECT ... FOR UPDATE OF ... SKIP LOCKED（需要 MySQL 8.0+），
+        多个 worker 同时领取时不会互相等待，也不会领到同一个 feed。
+
+        Args:
+            owner: worker 标识
+            limit: 最多领取数量
+            lease_seconds: 租约时长（秒）
+
+        Returns:
+            schedules: 领取到的轮询计划
+        """
+        now = datetime.now()
+
+        def work(conn, cursor):
+            cursor.execute(
+                "SELECT feed_url, interval_seconds, next_poll_at, last_item_at FROM feed_schedule "
+                "WHERE next_poll_at <= %s AND (lease_owner IS NULL OR lease_expires_at < %s) "
+                "AND feed_url IN (SELECT feed_url FROM channel_subscriptions WHERE is_active = TRUE) "
+                "ORDER BY next_poll_at LIMIT %s FOR UPDATE OF feed_schedule SKIP LOCKED",
+                (now, now, limit)
+            )
+            rows = cursor.fetchall()
+            if rows:
+                placeholders = ', '.join(['%s'] * len(rows))
+                cursor.execute(
+                    f"UPDATE feed_schedule SET lease_owner = %s, lease_expires_at = %s "
+                    f"WHERE feed_url IN ({placeholders})",
+                    (owner, now + timedelta(seconds=lease_seconds), *(row['feed_url'] for row in rows))
+                )
+            conn.commit()
+            return rows
+
+        return self._run(work, dictionary=True)
+
+    def renew_leases(self, owner: str, feed_urls: List[str], lease_seconds: int) -> int:
+        """
+        续期 worker 持有的租约
+
+        Returns:
+            count: 成功续期的数量，小于 feed_urls 数量说明部分租约已丢失
+        """
+        expires_at = datetime.now() + timedelta(seconds=lease_seconds)
+
+        def work(conn, cursor):
+            placeholders = ', '.join(['%s'] * len(feed_urls))
+            cursor.execute(
+                f"UPDATE feed_schedule SET lease_expires_at = %s "
+                f"WHERE lease_owner = %s AND feed_url IN ({placeholders})",
+                (expires_at, owner, *feed_urls)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(work)
+
+    def release_feed(self, owner: str, feed_url: str, interval_seconds: int, next_poll_at: datetime,
+                     last_item_at: Optional[datetime]) -> bool:
+        """
+        保存轮询计划并释放租约
+
+        Returns:
+            success: 租约仍由 owner 持有并成功释放时返回 True
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "UPDATE feed_schedule SET interval_seconds = %s, next_poll_at = %s, last_item_at = %s, "
+                "lease_owner = NULL, lease_expires_at = NULL, updated_at = %s "
+                "WHERE feed_url = %s AND lease_owner = %s",
+                (interval_seconds, next_poll_at, last_item_at, datetime.now(), feed_url, owner)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+        return self._run(work)
+
+    def release_leases(self, owner: str) -> int:
+        """
+        释放 worker 持有的所有租约（正常退出时调用）
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "UPDATE feed_schedule SET lease_owner = NULL, lease_expires_at = NULL WHERE lease_owner = %s",
+                (owner,)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(work)
+
+    def get_seen_hashes(self, subscription_id: int, hashes: List[int]) -> List[int]:
+        """
+        批量查询已处理的条目
+
+        Args:
+            subscription_id: 订阅 ID
+            hashes: 条目哈希列表
+
+        Returns:
+            hashes: 其中已处理过的条目哈希
+        """
+        def work(conn, cursor):
+            found = []
+            for start in range(0, len(hashes), BATCH_SIZE):
+                batch = hashes[start:start + BATCH_SIZE]
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(
+                    f"SELECT item_hash FROM seen_items WHERE subscription_id = %s AND item_hash IN ({placeholders})",
+                    (subscription_id, *batch)
+                )
+                found.extend(row[0] for row in cursor.fetchall())
+            return found
+
+        return self._run(work)
+
+    def has_seen_items(self, subscription_id: int) -> bool:
+        """
+        订阅是否有任何已处理的条目记录
+        """
+        def work(conn, cursor):
+            cursor.execute("SELECT 1 FROM seen_items WHERE subscription_id = %s LIMIT 1", (subscription_id,))
+            return cursor.fetchone() is not None
+
+        return self._run(work)
+
+    def add_seen_items(self, subscription_id: int, hashes: List[int]) -> int:
+        """
+        批量记录已处理的条目
+
+        Args:
+            subscription_id: 订阅 ID
+            hashes: 条目哈希列表
+
+        Returns:
+            count: 新插入的记录数
+        """
+        now = datetime.now()
+
+        def work(conn, cursor):
+            cursor.executemany(
+                "INSERT IGNORE INTO seen_items (subscription_id, item_hash, created_at) VALUES (%s, %s, %s)",
+                [(subscription_id, h, now) for h in hashes]
+            )
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(work)
+
+    def get_file_id(self, bot_id: int, url_hash: str) -> Optional[str]:
+        """
+        获取 bot 上传过的图片的 file_id
+
+        Args:
+            bot_id: bot ID
+            url_hash: 图片地址的 SHA-1
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "SELECT file_id FROM telegram_file_ids WHERE bot_id = %s AND url_hash = %s",
+                (bot_id, url_hash)
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+        return self._run(work)
+
+    def save_file_id(self, bot_id: int, url_hash: str, file_id: str) -> bool:
+        """
+        保存图片的 file_id
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "INSERT INTO telegram_file_ids (bot_id, url_hash, file_id, updated_at) VALUES (%s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE file_id = VALUES(file_id), updated_at = VALUES(updated_at)",
+                (bot_id, url_hash, file_id, datetime.now())
+            )
+            conn.commit()
+            return True
+
+        return self._run(work)
+
+    def delete_file_id(self, bot_id: int, url_hash: str) -> bool:
+        """
+        删除失效的 file_id
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "DELETE FROM telegram_file_ids WHERE bot_id = %s AND url_hash = %s",
+                (bot_id, url_hash)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+        return self._run(work)
+
+    def get_telegraph_page(self, content_hash: str, created_after: datetime) -> Optional[str]:
+        """
+        获取内容相同且未过期的 Telegraph 页面路径
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "SELECT path FROM telegraph_pages WHERE content_hash = %s AND created_at >= %s",
+                (content_hash, created_after)
+            )
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+        return self._run(work)
+
+    def save_telegraph_page(self, content_hash: str, path: str) -> bool:
+        """
+        保存 Telegraph 页面路径
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "INSERT INTO telegraph_pages (content_hash, path, created_at) VALUES (%s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE path = VALUES(path), created_at = VALUES(created_at)",
+                (content_hash, path, datetime.now())
+            )
+            conn.commit()
+            return True
+
+        return self._run(work)
+
+    def purge_file_ids(self, before: datetime) -> int:
+        """
+        删除 updated_at 早于 before 的 file_id 记录
+        """
+        def work(conn, cursor):
+            cursor.execute("DELETE FROM telegram_file_ids WHERE updated_at < %s", (before,))
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(work)
+
+    def purge_telegraph_pages(self, before: datetime) -> int:
+        """
+        删除早于 before 的页面记录
+        """
+        def work(conn, cursor):
+            cursor.execute("DELETE FROM telegraph_pages WHERE created_at < %s", (before,))
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(work)
+
+    def enqueue_deliveries(self, subscription_id: int, entries: List[Tuple[int, str]]) -> int:
+        """
+        将条目加入投递队列，已在队列中的条目会被忽略
+
+        Args:
+            subscription_id: 订阅 ID
+            entries: (条目哈希, 序列化的条目) 列表，按投递顺序排列
+
+        Returns:
+            count: 新加入队列的条目数
+        """
+        now = datetime.now()
+
+        def work(conn, cursor):
+            cursor.executemany(
+                "INSERT IGNORE INTO delivery_outbox "
+                "(subscription_id, item_hash, payload, next_attempt_at, created_at, updated_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                [(subscription_id, h, payload, now, now, now) for h, payload in entries]
+            )
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(work)
+
+    def claim_deliveries(self, owner: str, limit: int, lease_seconds: int,
+                         exclude: Tuple[int, ...] = ()) -> List[Dict[str, Any]]:
+        """
+        领取待投递的条目
+
+        包括到期的 pending 条目，以及租约已过期（领取它的进程已退出）的 sending 条目。
+        同一订阅中存在更早的、尚在退避或正被发送的条目时不领取，保证按入队顺序发送。
+        领取后 attempts 加一。
+
+        Args:
+            owner: worker 标识
+            limit: 最多领取数量
+            lease_seconds: 租约时长（秒）
+            exclude: 本进程仍在处理的条目 ID，即使租约已过期也不重新领取
+
+        Returns:
+            deliveries: 投递记录，附带订阅的 channel_id、channel_name 和 is_active
+        """
+        now = datetime.now()
+
+        def work(conn, cursor):
+            excluded = ''
+            if exclude:
+                excluded = f"AND o.id NOT IN ({', '.join(['%s'] * len(exclude))}) "
+            cursor.execute(
+                "SELECT o.id, o.subscription_id, o.payload, o.page_link, o.attempts, "
+                "s.channel_id, s.channel_name, s.is_active "
+                "FROM delivery_outbox o JOIN channel_subscriptions s ON s.id = o.subscription_id "
+                "WHERE ((o.status = 'pending' AND o.next_attempt_at <= %s) "
+                "OR (o.status = 'sending' AND o.lease_expires_at < %s)) "
+                "AND NOT EXISTS (SELECT 1 FROM delivery_outbox p "
+                "WHERE p.subscription_id = o.subscription_id AND p.id < o.id "
+                "AND ((p.status = 'pending' AND p.next_attempt_at > %s) "
+                "OR (p.status = 'sending' AND p.lease_expires_at >= %s))) "
+                + excluded +
+                "ORDER BY o.id LIMIT %s FOR UPDATE OF o SKIP LOCKED",
+                (now, now, now, now, *exclude, limit)
+            )
+            rows = cursor.fetchall()
+            if rows:
+                placeholders = ', '.join(['%s'] * len(rows))
+                cursor.execute(
+                    f"UPDATE delivery_outbox SET status = 'sending', attempts = attempts + 1, "
+                    f"lease_owner = %s, lease_expires_at = %s, updated_at = %s WHERE id IN ({placeholders})",
+                    (owner, now + timedelta(seconds=lease_seconds), now, *(row['id'] for row in rows))
+                )
+                for row in rows:
+                    row['attempts'] += 1
+            conn.commit()
+            return rows
+
+        return self._run(work, dictionary=True)
+
+    def save_delivery_page(self, delivery_id: int, page_link: str) -> bool:
+        """
+        记录已创建的 Telegraph 页面，重试时不再重复创建
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "UPDATE delivery_outbox SET page_link = %s, updated_at = %s WHERE id = %s",
+                (page_link, datetime.now(), delivery_id)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+        return self._run(work)
+
+    def renew_deliveries(self, owner: str, delivery_ids: List[int], lease_seconds: int) -> int:
+        """
+        续期 worker 仍持有的投递租约
+
+        Returns:
+            count: 成功续期的条目数
+        """
+        if not delivery_ids:
+            return 0
+        now = datetime.now()
+
+        def work(conn, cursor):
+            placeholders = ', '.join(['%s'] * len(delivery_ids))
+            cursor.execute(
+                f"UPDATE delivery_outbox SET lease_expires_at = %s "
+                f"WHERE status = 'sending' AND lease_owner = %s AND id IN ({placeholders})",
+                (now + timedelta(seconds=lease_seconds), owner, *delivery_ids)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(work)
+
+    def complete_delivery(self, delivery_id: int, owner: str) -> bool:
+        """
+        标记条目投递成功，同时清除载荷
+
+        只有租约仍由 owner 持有时才更新，返回 False 表示租约已丢失
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "UPDATE delivery_outbox SET status = 'sent', payload = '', last_error = NULL, "
+                "lease_owner = NULL, lease_expires_at = NULL, updated_at = %s "
+                "WHERE id = %s AND status = 'sending' AND lease_owner = %s",
+                (datetime.now(), delivery_id, owner)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+        return self._run(work)
+
+    def fail_delivery(self, delivery_id: int, error: str, next_attempt_at: Optional[datetime],
+                      owner: str) -> bool:
+        """
+        记录投递失败
+
+        只有租约仍由 owner 持有时才更新，返回 False 表示租约已丢失
+
+        Args:
+            delivery_id: 投递记录 ID
+            error: 错误信息
+            next_attempt_at: 下一次重试时间，为 None 时进入死信（status = 'dead'）
+            owner: worker 标识
+        """
+        now = datetime.now()
+        status = 'pending' if next_attempt_at is not None else 'dead'
+
+        def work(conn, cursor):
+            cursor.execute(
+                "UPDATE delivery_outbox SET status = %s, last_error = %s, next_attempt_at = %s, "
+                "lease_owner = NULL, lease_expires_at = NULL, updated_at = %s "
+                "WHERE id = %s AND status = 'sending' AND lease_owner = %s",
+                (status, error[:1000], next_attempt_at or now, now, delivery_id, owner)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+
+        return self._run(work)
+
+    def defer_deliveries(self, owner: str, delivery_ids: List[int], next_attempt_at: datetime) -> int:
+        """
+        将 worker 领取但未发送的条目放回队列，推迟到 next_attempt_at，不计入重试次数
+
+        同一订阅中前面的条目发送失败时调用，后面的条目等它重试后再发送。
+        """
+        if not delivery_ids:
+            return 0
+
+        def work(conn, cursor):
+            placeholders = ', '.join(['%s'] * len(delivery_ids))
+            cursor.execute(
+                f"UPDATE delivery_outbox SET status = 'pending', attempts = GREATEST(attempts - 1, 0), "
+                f"next_attempt_at = %s, lease_owner = NULL, lease_expires_at = NULL "
+                f"WHERE status = 'sending' AND lease_owner = %s AND id IN ({placeholders})",
+                (next_attempt_at, owner, *delivery_ids)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(work)
+
+    def release_deliveries(self, owner: str) -> int:
+        """
+        将 worker 领取但未完成的条目放回队列（正常退出时调用），不计入重试次数
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "UPDATE delivery_outbox SET status = 'pending', attempts = GREATEST(attempts - 1, 0), "
+                "lease_owner = NULL, lease_expires_at = NULL WHERE status = 'sending' AND lease_owner = %s",
+                (owner,)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(work)
+
+    def count_deliveries(self) -> Dict[str, int]:
+        """
+        统计投递队列中各状态的条目数
+        """
+        def work(conn, cursor):
+            cursor.execute("SELECT status, COUNT(*) FROM delivery_outbox GROUP BY status")
+            return {status: count for status, count in cursor.fetchall()}
+
+        return self._run(work)
+
+    def purge_deliveries(self, before: datetime) -> int:
+        """
+        删除早于 before 的已投递记录，死信保留以便排查
+        """
+        def work(conn, cursor):
+            cursor.execute(
+                "DELETE FROM delivery_outbox WHERE status = 'sent' AND updated_at < %s",
+                (before,)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(work)
 
     def close(self):
         """
         关闭数据库连接
         """
-        if self.conn and self.conn.is_connected():
-            self.conn.close()
-            logging.info("Database connection closed")
+        self.pool.close()
+        logging.info("Database connection closed")
+
+
+class AsyncDBManager:
+    """
+    DBManager 的异步版本，方法与 DBManager 一致
+
+    每个调用都在有界线程池中执行，慢查询不会阻塞事件循环。
+    线程池大小即最大并发连接数。
+    """
+
+    def __init__(self, manager: DBManager, pool_size: int):
+        self.manager = manager
+        self._executor = ThreadPoolExecutor(max_workers=max(1, pool_size),
+                                            thread_name_prefix='db')
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.manager, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            start = time.perf_counter()
+            try:
+                return await loop.run_in_executor(
+                    self._executor, functools.partial(attr, *args, **kwargs))
+            finally:
+                DB_QUERY_SECONDS.observe(time.perf_counter() - start, method=name)
+
+        # 缓存包装后的方法，避免重复创建
+        setattr(self, name, method)
+        return method
+
+    async def close(self):
+        """
+        关闭连接池并停止线程池
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.manager.close)
+        self._executor.shutdown(wait=False)
+
+
+class WatermarkBuffer:
+    """
+    订阅时间戳的延迟批量写入
+
+    同一订阅的多次更新在内存中合并为最大值，定期或积累到一定数量后
+    用一条语句写入数据库。条目加入投递队列时即记录其时间，watermark 可能越过之后
+    进入死信的条目；送达由投递队列保证，watermark 只用于过滤旧条目。
+    """
+
+    def __init__(self, db: AsyncDBManager, flush_interval: float, flush_size: int):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._pending: Dict[int, datetime] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flushing: Optional[asyncio.Task] = None
+
+    def record(self, subscription_id: int, pub_date: datetime):
+        """
+        记录订阅的新时间戳
+        """
+        current = self._pending.get(subscription_id)
+        if current is None or pub_date > current:
+            self._pending[subscription_id] = pub_date
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if len(self._pending) >= self.flush_size and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.create_task(self.flush())
+
+    def _merge(self, updates: Dict[int, datetime]):
+        for subscription_id, pub_date in updates.items():
+            current = self._pending.get(subscription_id)
+            if current is None or pub_date > current:
+                self._pending[subscription_id] = pub_date
+
+    async def flush(self):
+        """
+        将积累的时间戳写入数据库，失败时放回缓冲区等待下次写入
+        """
+        async with self._lock:
+            if not self._pending:
+                return
+            updates, self._pending = self._pending, {}
+            try:
+                await self.db.update_subscription_timestamps(updates)
+                logging.info(f"Flushed {len(updates)} subscription timestamps")
+            except Exception as e:
+                logging.error(f"Error flushing subscription timestamps: {e}")
+                self._merge(updates)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        """
+        停止定期写入并写入剩余的时间戳
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
 
 
 # 单例模式，全局数据库连接
 _db_instance = None
+_watermark_buffer = None
 
 
-def init_db(host: str, user: str, password: str, database: str) -> DBManager:
+def init_db(host: str, user: str, password: str, database: str, pool_size: int = 5,
+            flush_interval: float = 5, flush_size: int = 100) -> AsyncDBManager:
     """
     初始化数据库管理器
     """
-    global _db_instance
+    global _db_instance, _watermark_buffer
     if _db_instance is None:
-        _db_instance = DBManager(host, user, password, database)
+        _db_instance = AsyncDBManager(DBManager(host, user, password, database), pool_size)
+        _watermark_buffer = WatermarkBuffer(_db_instance, flush_interval, flush_size)
     return _db_instance
 
 
-def get_db() -> DBManager:
+def get_watermark_buffer() -> WatermarkBuffer:
+    """
+    获取订阅时间戳写入缓冲区
+    """
+    global _watermark_buffer
+    if _watermark_buffer is None:
+        raise RuntimeError("Database not initialized. Call init_db first.")
+    return _watermark_buffer
+
+
+def get_db() -> AsyncDBManager:
     """
     获取数据库管理器实例
     """
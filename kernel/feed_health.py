@@ -0,0 +1,122 @@
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional, Tuple
+
+import aiohttp
+
+from kernel.config import health_config
+from kernel.db_manager import get_db
+from kernel.http_client import get_session
+
+
+class FeedHealth(NamedTuple):
+    failures: int  # 连续失败次数
+    last_error: str
+    next_attempt: datetime  # 下一次允许抓取的时间
+
+
+def health_from_row(row) -> Optional[FeedHealth]:
+    """
+    将 feed_health 表的记录转换为 FeedHealth
+    """
+    if not row:
+        return None
+    return FeedHealth(row['failures'], row['last_error'] or '', row['next_attempt'])
+
+
+def is_open(health: Optional[FeedHealth]) -> bool:
+    """
+    连续失败达到阈值后熔断，之后只用 HEAD 探测
+    """
+    return health is not None and health.failures >= health_config['threshold']
+
+
+def describe(health: Optional[FeedHealth]) -> str:
+    """
+    订阅列表中显示的健康状态
+    """
+    if health is None:
+        return 'ok'
+    state = 'circuit open' if is_open(health) else 'failing'
+    return (f"{state}: {health.failures} failures, last error: {health.last_error}, "
+            f"next attempt {health.next_attempt:%Y-%m-%d %H:%M}")
+
+
+async def probe(feed_url: str) -> Optional[str]:
+    """
+    用 HEAD 请求探测 feed 是否恢复，不支持 HEAD 时改用只取第一个字节的 GET
+
+    Returns:
+        error: 探测失败的原因，恢复时返回 None
+    """
+    timeout = aiohttp.ClientTimeout(total=health_config['probe_timeout'])
+    try:
+        async with get_session().head(feed_url, timeout=timeout, allow_redirects=True) as response:
+            status = response.status
+        if status in (405, 501):
+            async with get_session().get(feed_url, timeout=timeout, headers={'Range': 'bytes=0-0'}) as response:
+                status = response.status
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    if status >= 400:
+        return f"HTTP {status}"
+    return None
+
+
+async def admit(feed_url: str) -> Tuple[bool, Optional[FeedHealth]]:
+    """
+    检查 feed 当前是否允许抓取
+
+    退避期内直接跳过；熔断状态下退避期结束后先探测，探测失败继续退避。
+    读取健康状态出错时不影响抓取。
+
+    Returns:
+        (allowed, health): 是否抓取，以及当前的健康状态（健康时为 None）
+    """
+    try:
+        health = health_from_row(await get_db().get_feed_health(feed_url))
+    except Exception as e:
+        logging.error(f"Error loading health of {feed_url}: {e}")
+        return True, None
+    if health is None:
+        return True, None
+    if datetime.now() < health.next_attempt:
+        return False, health
+    if is_open(health):
+        error = await probe(feed_url)
+        if error is not None:
+            await record_failure(feed_url, health, f"probe: {error}")
+            return False, health
+    return True, health
+
+
+async def record_failure(feed_url: str, health: Optional[FeedHealth], error: str) -> FeedHealth:
+    """
+    记录一次抓取失败，按连续失败次数指数退避
+    """
+    failures = (health.failures if health else 0) + 1
+    delay = min(health_config['max_delay'], health_config['base_delay'] * 2 ** (failures - 1))
+    delay *= random.uniform(0.5, 1.0)
+    health = FeedHealth(failures, error[:255], datetime.now() + timedelta(seconds=delay))
+    if failures == health_config['threshold']:
+        logging.warning(f"Circuit opened for {feed_url} after {failures} failures: {error}")
+    try:
+        await get_db().save_feed_health(feed_url, *health)
+    except Exception as e:
+        logging.error(f"Error saving health of {feed_url}: {e}")
+    return health
+
+
+async def record_success(feed_url: str, health: Optional[FeedHealth]):
+    """
+    抓取成功，清除失败记录
+    """
+    if health is None:
+        return
+    if is_open(health):
+        logging.info(f"Circuit closed for {feed_url}")
+    try:
+        await get_db().delete_feed_health(feed_url)
+    except Exception as e:
+        logging.error(f"Error clearing health of {feed_url}: {e}")
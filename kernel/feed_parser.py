@@ -1,44 +1,416 @@
-import feedparser
-from typing import List, NamedTuple
+from typing import AsyncIterator, List, NamedTuple, Optional, Tuple
 import logging
-import aiohttp
 import asyncio
+import aiohttp
+import calendar
+import hashlib
+import multiprocessing
+import tempfile
 import time
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from xml.etree import ElementTree
+from kernel.config import parse_config
+from kernel.db_manager import get_db
+from kernel.feed_health import admit, record_failure, record_success
+from kernel.http_client import get_session
+from kernel.metrics import FEED_FETCH_SECONDS, FEED_FETCH_TOTAL, FEED_PARSE_SECONDS, host_of
 
 class FeedItem(NamedTuple):
     title: str
     description: str
     link: str
     pubDate: int  # 改为存储UTC时间戳
+    guid: str = ''
+
+
+# 流式解析时作为条目的元素（RSS item、Atom entry）
+ITEM_TAGS = {'item', 'entry'}
+# 发布时间早于 watermark 超过该时长（秒）的条目视为已处理过的旧条目
+CUTOFF_GRACE = 86400
+# 按从新到旧排列时，连续遇到多少个旧条目后停止读取
+CUTOFF_RUN = 3
+# 流式下载的分块大小（字节）
+STREAM_CHUNK_SIZE = 64 * 1024
+# 流式解析失败时需要完整内容，下载的内容超过该大小（字节）后写入临时文件，不占用内存
+STREAM_SPOOL_SIZE = 1024 * 1024
+
+# 解析进程池，首次使用时创建
+_parse_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _parse_entries(content: bytes) -> List[Tuple[str, str, str, int, str]]:
+    """
+    解析 feed 内容，返回按 FeedItem 字段顺序排列的元组
+
+    该函数在解析进程中执行，只返回精简后的元组以减少进程间传输。
+    feedparser 导入较慢，首次解析时才导入。
+    """
+    import feedparser
+    feed = feedparser.parse(content)
+
+    items = []
+    for entry in feed.entries:
+        title = entry.get('title', 'No title')
+        description = entry.get('description', '')
+        link = entry.get('link', '')
+        guid = entry.get('id', '')
+        # published_parsed 是 UTC 的 struct_time，用 timegm 转换为UTC时间戳
+        parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+        pubDate = calendar.timegm(parsed) if parsed else 0
+
+        items.append((title, description, link, pubDate, guid))
+
+    return items
+
+
+def _get_parse_executor() -> ProcessPoolExecutor:
+    global _parse_executor
+    if _parse_executor is None:
+        # 使用 spawn 启动，避免 fork 带有线程的主进程
+        _parse_executor = ProcessPoolExecutor(
+            max_workers=parse_config['workers'],
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _parse_executor
+
+
+async def parse_content(content: bytes) -> List[FeedItem]:
+    """
+    解析 feed 内容
+
+    内容较大时在进程池中解析，不阻塞事件循环；较小的内容直接解析。
+    """
+    if parse_config['workers'] <= 0 or len(content) < parse_config['inline_max_bytes']:
+        with FEED_PARSE_SECONDS.time(mode='inline'):
+            rows = _parse_entries(content)
+    else:
+        loop = asyncio.get_running_loop()
+        with FEED_PARSE_SECONDS.time(mode='pool'):
+            rows = await loop.run_in_executor(_get_parse_executor(), _parse_entries, content)
+    return [FeedItem._make(row) for row in rows]
+
 
-async def parse_feed(feed_url: str) -> List[FeedItem]:
+def close_parse_executor():
+    """
+    关闭解析进程池
+    """
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+        _parse_executor = None
+
+
+async def parse_feed(feed_url: str, conditional: bool = False) -> Optional[List[FeedItem]]:
+    """
+    抓取并解析 feed
+
+    Args:
+        feed_url: 订阅的 URL
+        conditional: 是否使用 ETag / Last-Modified 条件请求，
+            feed 未变化（304 或内容哈希相同）时返回 None
+
+    Returns:
+        items: 条目列表，出错时返回空列表
+    """
+    host = host_of(feed_url)
+    # 最近失败过的 feed 在退避期内直接跳过，熔断后先探测
+    allowed, health = await admit(feed_url)
+    if not allowed:
+        FEED_FETCH_TOTAL.inc(host=host, status='backoff')
+        logging.debug(f"Skipping failing feed {feed_url} until {health.next_attempt}")
+        return []
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(feed_url) as response:
+        headers = {}
+        cache = await get_db().get_feed_cache(feed_url) if conditional else None
+        if cache:
+            if cache['etag']:
+                headers['If-None-Match'] = cache['etag']
+            if cache['last_modified']:
+                headers['If-Modified-Since'] = cache['last_modified']
+
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            async with get_session().get(feed_url, headers=headers) as response:
+                status = response.status
+                if response.status == 304:
+                    logging.debug(f"Feed not modified: {feed_url}")
+                    await record_success(feed_url, health)
+                    return None
+
                 if response.status != 200:
                     logging.error(f"Failed to fetch feed: {response.status}")
+                    await record_failure(feed_url, health, f"HTTP {response.status}")
                     return []
 
-                content = await response.text()
-                feed = feedparser.parse(content)
-
-                items = []
-                for entry in feed.entries:
-                    title = entry.get('title', 'No title')
-                    description = entry.get('description', '')
-                    link = entry.get('link', '')
-                    # 使用published_parsed转换为UTC时间戳
-                    pubDate = int(time.mktime(entry.get('published_parsed', time.gmtime(0))))
-                    
-                    items.append(FeedItem(
-                        title=title,
-                        description=description,
-                        link=link,
-                        pubDate=pubDate
-                    ))
-
-                return items
+                content = await response.read()
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+        finally:
+            FEED_FETCH_SECONDS.observe(time.perf_counter() - start, host=host)
+            FEED_FETCH_TOTAL.inc(host=host, status=status)
+        await record_success(feed_url, health)
+        body_hash = hashlib.sha1(content).hexdigest()
+
+        if cache and cache['body_hash'] == body_hash:
+            logging.debug(f"Feed body unchanged: {feed_url}")
+            if (etag, last_modified) != (cache['etag'], cache['last_modified']):
+                await get_db().save_feed_cache(feed_url, etag, last_modified, body_hash)
+            return None
+
+        items = await parse_content(content)
+
+        if conditional:
+            await get_db().save_feed_cache(feed_url, etag, last_modified, body_hash)
+        return items
+    except Exception as e:
+        logging.error(f"Error parsing feed: {e}")
+        if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+            await record_failure(feed_url, health, f"{type(e).__name__}: {e}")
+        return []
+
+
+def _local_name(tag) -> str:
+    # 去掉命名空间，例如 {http://www.w3.org/2005/Atom}entry -> entry
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def _element_text(element) -> str:
+    """
+    元素的内容，包含子元素时（例如 Atom 的 xhtml 内容）保留子元素的标记
+    """
+    text = element.text or ''
+    if len(element):
+        text += ''.join(ElementTree.tostring(child, encoding='unicode') for child in element)
+    return text.strip()
+
+
+def _parse_date(value: str) -> int:
+    """
+    解析 RFC 822（RSS）或 ISO 8601（Atom）格式的时间，返回 UTC 时间戳，无法解析时返回 0
+    """
+    value = value.strip()
+    if not value:
+        return 0
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return 0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def _first(fields: dict, *names: str):
+    # 元素没有子元素时为假值，不能用 or 连接
+    for name in names:
+        if fields.get(name) is not None:
+            return fields[name]
+    return None
+
+
+def _item_from_element(element) -> FeedItem:
+    """
+    将 RSS item 或 Atom entry 元素转换为 FeedItem，字段取值与 feedparser 的 entry 一致
+    """
+    fields = {}
+    link = ''
+    for child in element:
+        name = _local_name(child.tag)
+        if name == 'link':
+            # Atom 的链接在 href 属性中，优先使用 rel=alternate
+            href = child.get('href')
+            if href is None:
+                link = link or (child.text or '').strip()
+            elif child.get('rel', 'alternate') == 'alternate' or not link:
+                link = href
+        elif name not in fields:
+            fields[name] = child
+    description = _first(fields, 'description', 'summary', 'encoded', 'content')
+    guid = _first(fields, 'guid', 'id')
+    date = _first(fields, 'pubDate', 'published', 'updated', 'date')
+    title = fields.get('title')
+    return FeedItem(
+        title=_element_text(title) if title is not None else 'No title',
+        description=_element_text(description) if description is not None else '',
+        link=link,
+        pubDate=_parse_date(date.text or '') if date is not None else 0,
+        guid=(guid.text or '').strip() if guid is not None else '',
+    )
+
+
+async def iter_feed_items(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[FeedItem]:
+    """
+    从字节流中逐个解析条目
+
+    每解析完一个条目立即产出并清空对应的元素，内存占用与单个条目的大小相当。
+    读取超过 max_bytes 时记录警告并停止，已产出的条目仍然有效。
+
+    Raises:
+        ElementTree.ParseError: 内容不是合法的 XML
+    """
+    parser = ElementTree.XMLPullParser(events=('end',))
+    size = 0
+    parse_time = 0.0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                logging.warning(f"Feed body exceeds {max_bytes} bytes, stopped reading")
+                return
+            start = time.perf_counter()
+            parser.feed(chunk)
+            events = list(parser.read_events())
+            parse_time += time.perf_counter() - start
+            for _, element in events:
+                if _local_name(element.tag) in ITEM_TAGS:
+                    yield _item_from_element(element)
+                    element.clear()
+        parser.close()
+        for _, element in parser.read_events():
+            if _local_name(element.tag) in ITEM_TAGS:
+                yield _item_from_element(element)
+    finally:
+        FEED_PARSE_SECONDS.observe(parse_time, mode='stream')
+
+
+async def stream_feed(feed_url: str, since: float = 0, conditional: bool = False) -> Optional[list]:
+    """
+    边下载边解析 feed，越过 watermark 后停止读取
+
+    条目解析后立即归一化，不保留描述原文。feed 通常按从新到旧排列，连续遇到
+    CUTOFF_RUN 个早于 since - CUTOFF_GRACE 且比前一个条目更早的条目后，认为后面都是
+    旧条目，不再读取。出现比前一个条目更新的条目时说明 feed 按从旧到新排列，
+    新条目在末尾，此时读取全部内容。
+    内容不是合法的 XML 时读取剩余内容，用 feedparser 完整解析已下载的内容；
+    下载的内容暂存在 SpooledTemporaryFile 中，超过 STREAM_SPOOL_SIZE 后写入磁盘。
+
+    Args:
+        feed_url: 订阅的 URL
+        since: 所有订阅中最早的 watermark（UTC 时间戳），0 表示不提前停止
+        conditional: 是否使用 ETag / Last-Modified 条件请求，
+            feed 未变化（304 或完整读取且内容哈希相同）时返回 None
+
+    Returns:
+        items: NormalizedItem 列表，出错时返回空列表
+    """
+    # normalizer 依赖本模块的 FeedItem，在函数内导入
+    from kernel.normalizer import normalize, normalize_items
+
+    host = host_of(feed_url)
+    # 最近失败过的 feed 在退避期内直接跳过，熔断后先探测
+    allowed, health = await admit(feed_url)
+    if not allowed:
+        FEED_FETCH_TOTAL.inc(host=host, status='backoff')
+        logging.debug(f"Skipping failing feed {feed_url} until {health.next_attempt}")
+        return []
+    cutoff = since - CUTOFF_GRACE if since > 0 else None
+    try:
+        headers = {}
+        cache = await get_db().get_feed_cache(feed_url) if conditional else None
+        if cache:
+            if cache['etag']:
+                headers['If-None-Match'] = cache['etag']
+            if cache['last_modified']:
+                headers['If-Modified-Since'] = cache['last_modified']
+
+        start = time.perf_counter()
+        status = 'error'
+        items = []
+        digest = hashlib.sha1()
+        # 已读取的原始内容，流式解析失败时交给 parse_content 完整解析，不再重新下载
+        body = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_SIZE)
+        size = 0
+        complete = True
+        fallback = False
+        try:
+            async with get_session().get(feed_url, headers=headers) as response:
+                status = response.status
+                if response.status == 304:
+                    logging.debug(f"Feed not modified: {feed_url}")
+                    await record_success(feed_url, health)
+                    return None
+
+                if response.status != 200:
+                    logging.error(f"Failed to fetch feed: {response.status}")
+                    await record_failure(feed_url, health, f"HTTP {response.status}")
+                    return []
+
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+
+                async def chunks():
+                    nonlocal size
+                    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                        size += len(chunk)
+                        digest.update(chunk)
+                        body.write(chunk)
+                        yield chunk
+
+                old_run = 0
+                previous = 0
+                stream = iter_feed_items(chunks(), parse_config['max_bytes'])
+                try:
+                    async for item in stream:
+                        items.append(normalize(item))
+                        if item.pubDate <= 0:
+                            old_run = 0
+                            continue
+                        if previous and item.pubDate > previous:
+                            # 按从旧到新排列，不能提前停止
+                            cutoff = None
+                        elif cutoff is not None and item.pubDate < cutoff:
+                            # 发布时间相同的条目无法判断顺序，不计入
+                            if item.pubDate < previous:
+                                old_run += 1
+                                if old_run >= CUTOFF_RUN:
+                                    complete = False
+                                    break
+                        else:
+                            old_run = 0
+                        previous = item.pubDate
+                except ElementTree.ParseError as e:
+                    logging.warning(f"Streaming parse of {feed_url} failed ({e}), falling back to full parse")
+                    fallback = True
+                finally:
+                    await stream.aclose()
+                if fallback:
+                    # 读取剩余内容
+                    async for _ in chunks():
+                        if size > parse_config['max_bytes']:
+                            break
+                if size > parse_config['max_bytes']:
+                    complete = False
+            if fallback:
+                body.seek(0)
+                content = body.read()
+        finally:
+            body.close()
+            FEED_FETCH_SECONDS.observe(time.perf_counter() - start, host=host)
+            FEED_FETCH_TOTAL.inc(host=host, status=status)
+        await record_success(feed_url, health)
+
+        # 只有完整读取时内容哈希才有意义
+        body_hash = digest.hexdigest() if complete else ''
+        if complete and cache and cache['body_hash'] == body_hash:
+            logging.debug(f"Feed body unchanged: {feed_url}")
+            if (etag, last_modified) != (cache['etag'], cache['last_modified']):
+                await get_db().save_feed_cache(feed_url, etag, last_modified, body_hash)
+            return None
+
+        if fallback:
+            items = normalize_items(await parse_content(content))
+
+        if conditional:
+            await get_db().save_feed_cache(feed_url, etag, last_modified, body_hash)
+        return items
     except Exception as e:
         logging.error(f"Error parsing feed: {e}")
+        if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+            await record_failure(feed_url, health, f"{type(e).__name__}: {e}")
         return []
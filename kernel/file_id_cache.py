@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from kernel.db_manager import get_db
+
+# 清理过期记录的最小间隔（秒）
+PURGE_INTERVAL = 3600
+
+
+def url_hash(url: str) -> str:
+    """
+    图片地址的 SHA-1，作为缓存 key
+    """
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+class FileIdCache:
+    """
+    图片地址到 Telegram file_id 的缓存
+
+    同一张图片第一次发送后记录 Telegram 返回的 file_id，之后同一个 bot 再发送时
+    直接使用 file_id，Telegram 不必重新下载远程图片。file_id 只对上传它的 bot 有效，
+    因此按 (bot id, 图片地址) 缓存。数据库中的 telegram_file_ids 表是持久记录，
+    前面加一层内存 LRU。表中超过 retention 未更新的记录定期清理，之后再发送时重新上传一次。
+    """
+
+    def __init__(self, capacity: int, retention: float):
+        self.capacity = capacity
+        self.retention = retention
+        self._lru = OrderedDict()
+        self._last_purge = float('-inf')
+
+    def _remember(self, key, file_id: str):
+        self._lru[key] = file_id
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    async def get(self, bot_id: int, url: str) -> Optional[str]:
+        """
+        查找 bot 发送过的图片的 file_id，没有时返回 None
+        """
+        key = (bot_id, url_hash(url))
+        file_id = self._lru.get(key)
+        if file_id is not None:
+            self._lru.move_to_end(key)
+            return file_id
+        try:
+            file_id = await get_db().get_file_id(*key)
+        except Exception as e:
+            logging.error(f"Error loading file_id for {url}: {e}")
+            return None
+        if file_id is not None:
+            self._remember(key, file_id)
+        return file_id
+
+    async def put(self, bot_id: int, url: str, file_id: str):
+        """
+        记录图片的 file_id
+        """
+        key = (bot_id, url_hash(url))
+        self._remember(key, file_id)
+        try:
+            await get_db().save_file_id(*key, file_id)
+            await self._purge()
+        except Exception as e:
+            logging.error(f"Error saving file_id for {url}: {e}")
+
+    async def _purge(self):
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        count = await get_db().purge_file_ids(datetime.now() - timedelta(seconds=self.retention))
+        if count:
+            logging.info(f"Purged {count} expired file_ids")
+
+    async def invalidate(self, bot_id: int, url: str):
+        """
+        删除被 Telegram 拒绝的 file_id
+        """
+        key = (bot_id, url_hash(url))
+        self._lru.pop(key, None)
+        try:
+            await get_db().delete_file_id(*key)
+        except Exception as e:
+            logging.error(f"Error deleting file_id for {url}: {e}")
+
+
+# 单例模式，全局 file_id 缓存
+_cache_instance = None
+
+
+def init_file_id_cache(capacity: int, retention: float) -> FileIdCache:
+    """
+    初始化 file_id 缓存
+    """
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = FileIdCache(capacity, retention)
+    return _cache_instance
+
+
+def get_file_id_cache() -> FileIdCache:
+    """
+    获取 file_id 缓存实例
+    """
+    global _cache_instance
+    if _cache_instance is None:
+        raise RuntimeError("File id cache not initialized. Call init_file_id_cache first.")
+    return _cache_instance
@@ -0,0 +1,82 @@
+import logging
+from typing import Optional
+
+import aiohttp
+from aiohttp.abc import AbstractResolver
+
+from kernel.config import http_config
+
+try:
+    import brotli  # noqa: F401  aiohttp 在安装 brotli 后才能解码 br
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+# 全局共享的 HTTP 会话
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def _create_resolver() -> AbstractResolver:
+    """
+    优先使用基于 aiodns 的异步解析器，未安装时退回线程池解析
+    """
+    try:
+        return aiohttp.AsyncResolver()
+    except Exception as e:
+        logging.warning(f"aiodns unavailable, falling back to threaded resolver: {e}")
+        return aiohttp.ThreadedResolver()
+
+
+def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=http_config['limit'],
+        limit_per_host=http_config['limit_per_host'],
+        use_dns_cache=True,
+        ttl_dns_cache=http_config['dns_cache_ttl'],
+        keepalive_timeout=http_config['keepalive_timeout'],
+        resolver=_create_resolver(),
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=http_config['total_timeout'],
+        sock_connect=http_config['connect_timeout'],
+        sock_read=http_config['read_timeout'],
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers={'Accept-Encoding': ACCEPT_ENCODING},
+    )
+
+
+async def init_session() -> aiohttp.ClientSession:
+    """
+    初始化全局 HTTP 会话
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+        logging.info("HTTP session initialized")
+    return _session
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    获取全局 HTTP 会话，未初始化时自动创建
+
+    必须在事件循环内调用。
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+    return _session
+
+
+async def close_session():
+    """
+    关闭全局 HTTP 会话
+    """
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logging.info("HTTP session closed")
+    _session = None
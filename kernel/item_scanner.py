@@ -0,0 +1,52 @@
+import codecs
+from typing import List
+
+ITEM_START = '<item>'
+ITEM_END = '</item>'
+
+
+class ItemScanner:
+    """
+    从字节流中逐块切分出 <item>...</item> 片段
+
+    只在缓冲区中保留尚未闭合的 item（以及可能被截断的开始标签），
+    已切分的内容立即丢弃，内存占用与单个 item 的大小相当，而不是整个文件。
+    """
+
+    def __init__(self, encoding: str = 'utf-8'):
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._buffer = ''
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """
+        输入一块数据，返回其中已完整的 item 片段（包含 <item> 和 </item>）
+        """
+        self._buffer += self._decoder.decode(chunk)
+        return self._scan()
+
+    def _scan(self) -> List[str]:
+        items = []
+        while True:
+            start = self._buffer.find(ITEM_START)
+            if start < 0:
+                # 保留末尾可能是半个开始标签的部分
+                keep = len(ITEM_START) - 1
+                self._buffer = self._buffer[-keep:] if len(self._buffer) > keep else self._buffer
+                break
+            end = self._buffer.find(ITEM_END, start + len(ITEM_START))
+            if end < 0:
+                self._buffer = self._buffer[start:]
+                break
+            end += len(ITEM_END)
+            items.append(self._buffer[start:end])
+            self._buffer = self._buffer[end:]
+        return items
+
+    def close(self) -> List[str]:
+        """
+        结束输入，返回剩余的完整 item（未闭合的 item 被丢弃）
+
+        遇到不完整的多字节字符时抛出 UnicodeDecodeError。
+        """
+        self._buffer += self._decoder.decode(b'', final=True)
+        return self._scan()
@@ -0,0 +1,213 @@
+import logging
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+from urllib.parse import urlsplit
+
+# 默认的直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    指标基类，按标签值保存各时间序列
+    """
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(key)} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            # 每个桶的计数（非累计）、总和
+            series = self._values[key] = [[0] * len(self.buckets), 0.0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        series[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """
+        记录代码块的执行时间
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+# 所有已定义的指标
+REGISTRY: List[_Metric] = []
+
+
+def host_of(url: str) -> str:
+    """
+    URL 的域名，作为 feed 相关指标的标签
+    """
+    return urlsplit(url).hostname or ''
+
+
+def render() -> str:
+    """
+    以 Prometheus 文本格式输出所有指标
+    """
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+# feed 抓取与解析
+FEED_FETCH_SECONDS = Histogram('rss_feed_fetch_seconds', 'Feed download latency', ['host'])
+FEED_FETCH_TOTAL = Counter('rss_feed_fetch_total', 'Feed fetches by HTTP status', ['host', 'status'])
+FEED_PARSE_SECONDS = Histogram('rss_feed_parse_seconds', 'Feed parse time', ['mode'])
+FEED_ITEMS_TOTAL = Counter('rss_feed_items_total', 'Items found, new and skipped', ['host', 'kind'])
+
+# Telegraph
+TELEGRAPH_REQUEST_SECONDS = Histogram('rss_telegraph_request_seconds', 'Telegraph API latency',
+                                      ['method', 'outcome'])
+TELEGRAPH_PAGE_CACHE_TOTAL = Counter('rss_telegraph_page_cache_total', 'Telegraph page lookups by result',
+                                     ['result'])
+
+# Telegram 发送
+TELEGRAM_SEND_SECONDS = Histogram('rss_telegram_send_seconds', 'Telegram send latency', ['bot', 'method'])
+TELEGRAM_SEND_TOTAL = Counter('rss_telegram_send_total', 'Telegram sends by outcome',
+                              ['bot', 'method', 'outcome'])
+TELEGRAM_RETRY_AFTER_TOTAL = Counter('rss_telegram_retry_after_total', 'Telegram 429 responses', ['bot'])
+TELEGRAM_FILE_ID_TOTAL = Counter('rss_telegram_file_id_total', 'Photo sends by file_id cache result',
+                                 ['result'])
+
+# 数据库
+DB_QUERY_SECONDS = Histogram('rss_db_query_seconds', 'Database call time including pool wait', ['method'])
+
+# 调度与投递
+SCHEDULER_CYCLE_SECONDS = Histogram('rss_scheduler_cycle_seconds', 'Polling cycle duration',
+                                    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800))
+SCHEDULER_FEEDS = Gauge('rss_scheduler_feeds', 'Subscribed feeds known to the scheduler')
+SCHEDULER_DUE_FEEDS = Gauge('rss_scheduler_due_feeds', 'Feeds polled in the latest cycle')
+OUTBOX_DELIVERIES = Gauge('rss_outbox_deliveries', 'Outbox entries by status', ['status'])
+OUTBOX_INFLIGHT = Gauge('rss_outbox_inflight_groups', 'Subscriptions currently being delivered')
+OUTBOX_RESULTS_TOTAL = Counter('rss_outbox_results_total', 'Delivery attempts by result', ['result'])
+
+
+async def _handle_metrics(request):
+    from aiohttp import web
+    return web.Response(body=render().encode('utf-8'),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+# 指标 HTTP 服务
+_runner = None
+
+
+async def start_metrics_server(host: str, port: int):
+    """
+    启动 /metrics HTTP 服务
+    """
+    global _runner
+    if _runner is None:
+        # 默认不启用，用到时才导入 aiohttp.web
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/metrics', _handle_metrics)
+        _runner = web.AppRunner(app, access_log=None)
+        await _runner.setup()
+        await web.TCPSite(_runner, host, port).start()
+        logging.info(f"Metrics available at http://{host}:{port}/metrics")
+    return _runner
+
+
+async def stop_metrics_server():
+    """
+    停止 /metrics HTTP 服务
+    """
+    global _runner
+    if _runner is not None:
+        await _runner.cleanup()
+        _runner = None
@@ -0,0 +1,64 @@
+import re
+from typing import Iterable, List, NamedTuple, Tuple
+
+from kernel.feed_parser import FeedItem
+from kernel.seen_index import item_hash
+from kernel.utils import generate_chinese_tags
+
+# 描述中的图片地址
+IMG_SRC_RE = re.compile(r'<img[^>]+src="([^">]+)"')
+# 标题中第一个包含汉字、日语或字母数字的单词
+FIRST_WORD_RE = re.compile(r'[\u4e00-\u9fa5\u3040-\u309F\u30A0-\u30FFa-zA-Z0-9]+')
+DEFAULT_FIRST_WORD = "美人图"
+
+
+class NormalizedItem(NamedTuple):
+    """
+    归一化后的条目
+
+    解析后只扫描一次标题和描述，发送、发布 Telegraph 和去重都直接使用这里的字段。
+    不保留原始描述，只保留其中的图片地址。
+    """
+    item_id: int
+    title: str
+    link: str
+    pubDate: int
+    guid: str
+    has_description: bool
+    image_urls: Tuple[str, ...]
+    tags: str
+    first_word: str
+
+    @property
+    def page_html(self) -> str:
+        """
+        Telegraph 页面内容，只包含图片
+        """
+        return ''.join(f'<img src="{url}" />' for url in self.image_urls)
+
+
+def normalize(item: FeedItem) -> NormalizedItem:
+    """
+    将解析得到的条目转换为 NormalizedItem
+    """
+    title = item.title or ''
+    description = item.description or ''
+    match = FIRST_WORD_RE.search(title)
+    return NormalizedItem(
+        item_id=item_hash(item),
+        title=title,
+        link=item.link,
+        pubDate=item.pubDate,
+        guid=item.guid,
+        has_description=bool(description),
+        image_urls=tuple(IMG_SRC_RE.findall(description)),
+        tags=generate_chinese_tags(title),
+        first_word=match.group(0) if match else DEFAULT_FIRST_WORD,
+    )
+
+
+def normalize_items(items: Iterable[FeedItem]) -> List[NormalizedItem]:
+    """
+    批量归一化条目，保持原顺序
+    """
+    return [normalize(item) for item in items]
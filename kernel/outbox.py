@@ -0,0 +1,334 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from kernel.db_manager import get_db
+from kernel.feed_parser import FeedItem
+from kernel.metrics import OUTBOX_DELIVERIES, OUTBOX_INFLIGHT, OUTBOX_RESULTS_TOTAL
+from kernel.normalizer import NormalizedItem, normalize
+
+# 清理已投递记录的间隔（秒）
+PURGE_INTERVAL = 3600
+# 统计队列各状态数量的间隔（秒）
+STATS_INTERVAL = 60
+
+
+class OutboxEntry(NamedTuple):
+    id: int
+    subscription_id: int
+    channel_id: int
+    channel_name: str
+    item: NormalizedItem
+    page_link: Optional[str]
+    attempts: int
+
+
+class PermanentDeliveryError(Exception):
+    """
+    重试也无法成功的投递错误，条目直接进入死信
+    """
+
+
+def decode_payload(payload: str) -> NormalizedItem:
+    """
+    从队列载荷恢复条目，兼容早期保存的 FeedItem 载荷
+    """
+    data = json.loads(payload)
+    if 'description' in data:
+        return normalize(FeedItem(**data))
+    data['image_urls'] = tuple(data['image_urls'])
+    return NormalizedItem(**data)
+
+
+def retry_delay(attempts: int, base_delay: float, max_delay: float) -> float:
+    """
+    第 attempts 次失败后的重试间隔（指数退避加随机抖动）
+    """
+    delay = min(max_delay, base_delay * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class DeliveryOutbox:
+    """
+    持久化的投递队列
+
+    轮询只负责把新条目写入 delivery_outbox 表，由后台 worker 按各自的速度发送，
+    Telegram 变慢时不会拖住 feed 的轮询。(subscription_id, item_hash) 作为幂等键，
+    同一条目重复入队只保留一条记录。
+
+    失败的条目按指数退避重试，超过最大次数或遇到 PermanentDeliveryError 时进入死信。
+    同一订阅的条目按入队顺序逐条发送；某条发送失败等待重试时，后面的条目放回队列，
+    等它重试之后再发送，不会越过它。
+
+    领取的条目在处理完之前定期续期租约；完成和失败只在租约仍由本 worker 持有时写入，
+    租约丢失（被其他 worker 重新领取）时不覆盖对方的状态。
+    """
+
+    def __init__(self, owner: str, workers: int, batch_size: int, lease_seconds: int,
+                 max_attempts: int, base_delay: float, max_delay: float,
+                 idle_interval: float, retention_days: int):
+        self.owner = owner
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.idle_interval = idle_interval
+        self.retention_days = retention_days
+        self._deliver: Optional[Callable[[OutboxEntry], Awaitable[None]]] = None
+        self._slots = asyncio.Semaphore(max(1, workers))
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._groups = set()
+        # 已领取但尚未处理完的条目 ID
+        self._held = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._renew_task: Optional[asyncio.Task] = None
+        self._last_purge = float('-inf')
+        self._last_stats = float('-inf')
+
+    def start(self, deliver: Callable[[OutboxEntry], Awaitable[None]]):
+        """
+        启动后台投递，重复调用无效
+
+        Args:
+            deliver: 发送单个条目的协程函数，抛出异常表示投递失败
+        """
+        if self._task is None:
+            self._deliver = deliver
+            self._task = asyncio.create_task(self._run())
+            self._renew_task = asyncio.create_task(self._renew_forever())
+
+    def wake(self):
+        """
+        有新条目入队时立即检查队列
+        """
+        self._wakeup.set()
+
+    async def enqueue(self, subscription_id: int, items: Sequence[NormalizedItem]) -> int:
+        """
+        将归一化后的条目按顺序加入投递队列
+
+        Returns:
+            count: 新加入队列的条目数
+        """
+        if not items:
+            return 0
+        entries = [(item.item_id, json.dumps(item._asdict(), ensure_ascii=False)) for item in items]
+        count = await get_db().enqueue_deliveries(subscription_id, entries)
+        self.wake()
+        return count
+
+    async def save_page(self, entry: OutboxEntry, page_link: str):
+        """
+        记录条目的 Telegraph 页面，重试时复用
+        """
+        await get_db().save_delivery_page(entry.id, page_link)
+
+    def _lock(self, subscription_id: int) -> asyncio.Lock:
+        lock = self._locks.get(subscription_id)
+        if lock is None:
+            lock = self._locks[subscription_id] = asyncio.Lock()
+        return lock
+
+    async def _handle(self, entry: OutboxEntry) -> Optional[datetime]:
+        """
+        发送一个条目并记录结果
+
+        Returns:
+            retry_at: 失败等待重试时返回重试时间，成功或进入死信时返回 None
+        """
+        retry_at = None
+        try:
+            async with self._slots:
+                await self._deliver(entry)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if isinstance(e, PermanentDeliveryError) or entry.attempts >= self.max_attempts:
+                OUTBOX_RESULTS_TOTAL.inc(result='dead')
+                logging.error(f"Delivery {entry.id} to {entry.channel_name} dead-lettered: {error}")
+                recorded = await get_db().fail_delivery(entry.id, error, None, self.owner)
+            else:
+                OUTBOX_RESULTS_TOTAL.inc(result='retry')
+                delay = retry_delay(entry.attempts, self.base_delay, self.max_delay)
+                logging.warning(f"Delivery {entry.id} to {entry.channel_name} failed, "
+                                f"retry in {delay:.0f}s: {error}")
+                retry_at = datetime.now() + timedelta(seconds=delay)
+                recorded = await get_db().fail_delivery(entry.id, error, retry_at, self.owner)
+        else:
+            OUTBOX_RESULTS_TOTAL.inc(result='sent')
+            recorded = await get_db().complete_delivery(entry.id, self.owner)
+        if not recorded:
+            logging.warning(f"Lease on delivery {entry.id} was lost before it finished")
+        return retry_at
+
+    async def _deliver_group(self, subscription_id: int, entries: List[OutboxEntry]):
+        async with self._lock(subscription_id):
+            for index, entry in enumerate(entries):
+                try:
+                    retry_at = await self._handle(entry)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # 数据库写入失败，条目在租约过期后会被重新领取
+                    logging.error(f"Error updating delivery {entry.id}: {e}")
+                    retry_at = datetime.now() + timedelta(seconds=self.lease_seconds)
+                finally:
+                    self._held.discard(entry.id)
+                if retry_at is not None:
+                    await self._defer(entries[index + 1:], retry_at)
+                    return
+
+    async def _defer(self, entries: List[OutboxEntry], retry_at: datetime):
+        """
+        前面的条目等待重试时，把同一订阅后面的条目放回队列
+        """
+        if not entries:
+            return
+        ids = [entry.id for entry in entries]
+        try:
+            await get_db().defer_deliveries(self.owner, ids, retry_at)
+        except Exception as e:
+            # 放回失败时条目在租约过期后会被重新领取，领取时仍排在失败的条目之后
+            logging.error(f"Error deferring deliveries {ids}: {e}")
+        finally:
+            self._held.difference_update(ids)
+
+    async def _claim(self) -> int:
+        rows = await get_db().claim_deliveries(self.owner, self.batch_size, self.lease_seconds,
+                                               tuple(self._held))
+        groups: Dict[int, List[OutboxEntry]] = OrderedDict()
+        for row in rows:
+            if not row['is_active']:
+                # 订阅已取消，不再发送
+                await get_db().fail_delivery(row['id'], 'subscription is inactive', None, self.owner)
+                continue
+            entry = OutboxEntry(
+                id=row['id'],
+                subscription_id=row['subscription_id'],
+                channel_id=row['channel_id'],
+                channel_name=row['channel_name'],
+                item=decode_payload(row['payload']),
+                page_link=row['page_link'],
+                attempts=row['attempts'],
+            )
+            self._held.add(entry.id)
+            groups.setdefault(entry.subscription_id, []).append(entry)
+        for subscription_id, entries in groups.items():
+            task = asyncio.create_task(self._deliver_group(subscription_id, entries))
+            self._groups.add(task)
+            task.add_done_callback(self._group_done)
+        OUTBOX_INFLIGHT.set(len(self._groups))
+        return len(rows)
+
+    def _group_done(self, task: asyncio.Task):
+        self._groups.discard(task)
+        OUTBOX_INFLIGHT.set(len(self._groups))
+        self.wake()
+
+    async def _renew_forever(self):
+        """
+        定期续期已领取条目的租约，等待订阅锁或发送限流时租约不会过期
+        """
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            held = list(self._held)
+            if not held:
+                continue
+            try:
+                renewed = await get_db().renew_deliveries(self.owner, held, self.lease_seconds)
+                # 续期期间处理完的条目不算丢失
+                expected = len(self._held.intersection(held))
+                if renewed < expected:
+                    logging.warning(f"Renewed {renewed} of {expected} delivery leases")
+            except Exception as e:
+                logging.error(f"Error renewing delivery leases: {e}")
+
+    async def _purge(self):
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        count = await get_db().purge_deliveries(datetime.now() - timedelta(days=self.retention_days))
+        if count:
+            logging.info(f"Purged {count} delivered outbox entries")
+
+    async def _update_stats(self):
+        if time.monotonic() - self._last_stats < STATS_INTERVAL:
+            return
+        self._last_stats = time.monotonic()
+        counts = await get_db().count_deliveries()
+        for status in ('pending', 'sending', 'sent', 'dead'):
+            OUTBOX_DELIVERIES.set(counts.get(status, 0), status=status)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            claimed = 0
+            try:
+                # 正在发送的订阅组达到 worker 数量时先不领取，避免领取后长时间等待导致租约过期
+                if len(self._groups) < self.workers:
+                    claimed = await self._claim()
+                await self._purge()
+                await self._update_stats()
+            except Exception as e:
+                logging.error(f"Error claiming deliveries: {e}")
+            if claimed >= self.batch_size and len(self._groups) < self.workers:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.idle_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        """
+        停止投递，并把已领取但未完成的条目放回队列
+        """
+        tasks = list(self._groups)
+        for task in (self._task, self._renew_task):
+            if task is not None:
+                tasks.append(task)
+        self._task = self._renew_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            count = await get_db().release_deliveries(self.owner)
+            if count:
+                logging.info(f"Released {count} unfinished deliveries")
+        except Exception as e:
+            logging.error(f"Error releasing deliveries: {e}")
+
+
+# 单例模式，全局投递队列
+_outbox_instance = None
+
+
+def init_outbox(owner: str, workers: int, batch_size: int, lease_seconds: int, max_attempts: int,
+                base_delay: float, max_delay: float, idle_interval: float,
+                retention_days: int) -> DeliveryOutbox:
+    """
+    初始化投递队列
+    """
+    global _outbox_instance
+    if _outbox_instance is None:
+        _outbox_instance = DeliveryOutbox(owner, workers, batch_size, lease_seconds, max_attempts,
+                                          base_delay, max_delay, idle_interval, retention_days)
+    return _outbox_instance
+
+
+def get_outbox() -> DeliveryOutbox:
+    """
+    获取投递队列实例
+    """
+    global _outbox_instance
+    if _outbox_instance is None:
+        raise RuntimeError("Outbox not initialized. Call init_outbox first.")
+    return _outbox_instance
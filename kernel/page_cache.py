@@ -0,0 +1,103 @@
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Sequence
+
+from kernel.cache import AsyncTTLCache
+from kernel.db_manager import get_db
+from kernel.metrics import TELEGRAPH_PAGE_CACHE_TOTAL
+
+# 清理过期页面记录的间隔（秒）
+PURGE_INTERVAL = 3600
+
+
+def page_key(title: str, image_urls: Sequence[str], author_name: Optional[str],
+             author_url: Optional[str]) -> str:
+    """
+    按页面内容计算缓存 key（SHA-1）
+
+    页面内容只由标题、图片列表和作者决定，内容相同的页面可以直接复用。
+    """
+    payload = json.dumps([title, list(image_urls), author_name, author_url], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class TelegraphPageCache:
+    """
+    内容寻址的 Telegraph 页面缓存
+
+    同一篇文章发到多个频道（作者相同时）或 /pub 重试时复用已创建的页面。
+    数据库中的 telegraph_pages 表是持久记录，超过 ttl 的记录视为失效并定期清理；
+    内存中使用 AsyncTTLCache，同一内容的并发创建只会调用一次 Telegraph。
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self._memory = AsyncTTLCache(ttl, maxsize)
+        self._last_purge = float('-inf')
+
+    async def _load(self, key: str, create: Callable[[], Awaitable[str]]) -> str:
+        db = get_db()
+        try:
+            path = await db.get_telegraph_page(key, datetime.now() - timedelta(seconds=self.ttl))
+        except Exception as e:
+            # 数据库不可用时不影响创建页面
+            logging.error(f"Error loading Telegraph page cache: {e}")
+            path = None
+        if path is not None:
+            TELEGRAPH_PAGE_CACHE_TOTAL.inc(result='db')
+            return path
+        path = await create()
+        TELEGRAPH_PAGE_CACHE_TOTAL.inc(result='created')
+        try:
+            await db.save_telegraph_page(key, path)
+            await self._purge()
+        except Exception as e:
+            logging.error(f"Error saving Telegraph page {path}: {e}")
+        return path
+
+    async def _purge(self):
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        count = await get_db().purge_telegraph_pages(datetime.now() - timedelta(seconds=self.ttl))
+        if count:
+            logging.info(f"Purged {count} expired Telegraph pages")
+
+    async def get_or_create(self, key: str, create: Callable[[], Awaitable[str]]) -> str:
+        """
+        返回内容对应的页面路径，没有缓存时调用 create 创建
+
+        Args:
+            key: page_key 计算的内容 key
+            create: 创建页面并返回路径的协程函数，抛出异常时不缓存
+        """
+        if self._memory.peek(key) is not None:
+            TELEGRAPH_PAGE_CACHE_TOTAL.inc(result='memory')
+        return await self._memory.get(key, lambda: self._load(key, create))
+
+
+# 单例模式，全局 Telegraph 页面缓存
+_cache_instance = None
+
+
+def init_page_cache(ttl: float, maxsize: int) -> TelegraphPageCache:
+    """
+    初始化 Telegraph 页面缓存
+    """
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = TelegraphPageCache(ttl, maxsize)
+    return _cache_instance
+
+
+def get_page_cache() -> TelegraphPageCache:
+    """
+    获取 Telegraph 页面缓存实例
+    """
+    global _cache_instance
+    if _cache_instance is None:
+        raise RuntimeError("Page cache not initialized. Call init_page_cache first.")
+    return _cache_instance
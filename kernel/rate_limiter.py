@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from telegram.error import RetryAfter
+
+from kernel.metrics import TELEGRAM_RETRY_AFTER_TOTAL, TELEGRAM_SEND_SECONDS, TELEGRAM_SEND_TOTAL
+
+
+class TokenBucket:
+    """
+    异步令牌桶
+
+    以 rate 个/秒的速度补充令牌，最多累积 capacity 个；等待者按先后顺序获取。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """
+        获取一个令牌，不足时等待
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """
+        暂停发放令牌并清空已累积的令牌
+        """
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0
+        self._updated = now
+
+
+def _retry_after_seconds(value: Any) -> float:
+    # 新版 python-telegram-bot 中 retry_after 为 timedelta
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+class SendRateLimiter:
+    """
+    Telegram 发送限流器
+
+    每个 bot 一个全局令牌桶，每个 (bot, chat) 一个令牌桶。
+    收到 RetryAfter 时只暂停对应的 chat，其他 chat 不受影响。
+    """
+
+    def __init__(self, bot_rate: float, bot_burst: float, chat_rate: float, chat_burst: float,
+                 max_retries: int = 3):
+        self.bot_rate = bot_rate
+        self.bot_burst = bot_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._bots: Dict[int, TokenBucket] = {}
+        self._chats: Dict[Tuple[int, Any], TokenBucket] = {}
+
+    def _bot_bucket(self, bot_id: int) -> TokenBucket:
+        bucket = self._bots.get(bot_id)
+        if bucket is None:
+            bucket = self._bots[bot_id] = TokenBucket(self.bot_rate, self.bot_burst)
+        return bucket
+
+    def _chat_bucket(self, bot_id: int, chat_id: Any) -> TokenBucket:
+        key = (bot_id, chat_id)
+        bucket = self._chats.get(key)
+        if bucket is None:
+            bucket = self._chats[key] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def send(self, bot, chat_id: Any, method: Callable[..., Awaitable[Any]], **kwargs) -> Any:
+        """
+        在限流下调用 bot 的发送方法
+
+        Args:
+            bot: Telegram bot
+            chat_id: 目标 chat
+            method: bot 的发送方法，例如 bot.send_photo
+            kwargs: 除 chat_id 外的发送参数
+
+        Returns:
+            发送方法的返回值
+        """
+        chat_bucket = self._chat_bucket(bot.id, chat_id)
+        bot_bucket = self._bot_bucket(bot.id)
+        method_name = getattr(method, '__name__', 'unknown')
+        attempt = 0
+        while True:
+            # 先等 chat 令牌，避免占用 bot 全局令牌后再长时间等待
+            await chat_bucket.acquire()
+            await bot_bucket.acquire()
+            start = time.perf_counter()
+            try:
+                result = await method(chat_id=chat_id, **kwargs)
+                TELEGRAM_SEND_TOTAL.inc(bot=bot.id, method=method_name, outcome='ok')
+                return result
+            except RetryAfter as e:
+                TELEGRAM_RETRY_AFTER_TOTAL.inc(bot=bot.id)
+                TELEGRAM_SEND_TOTAL.inc(bot=bot.id, method=method_name, outcome='retry_after')
+                seconds = _retry_after_seconds(e.retry_after)
+                chat_bucket.pause(seconds)
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                logging.warning(f"Rate limited in chat {chat_id}, retry after {seconds}s")
+            except Exception:
+                TELEGRAM_SEND_TOTAL.inc(bot=bot.id, method=method_name, outcome='error')
+                raise
+            finally:
+                TELEGRAM_SEND_SECONDS.observe(time.perf_counter() - start, bot=bot.id, method=method_name)
+
+
+# 单例模式，全局发送限流器
+_limiter_instance = None
+
+
+def init_rate_limiter(bot_rate: float, bot_burst: float, chat_rate: float, chat_burst: float,
+                      max_retries: int = 3) -> SendRateLimiter:
+    """
+    初始化发送限流器
+    """
+    global _limiter_instance
+    if _limiter_instance is None:
+        _limiter_instance = SendRateLimiter(bot_rate, bot_burst, chat_rate, chat_burst, max_retries)
+    return _limiter_instance
+
+
+def get_rate_limiter() -> SendRateLimiter:
+    """
+    获取发送限流器实例
+    """
+    global _limiter_instance
+    if _limiter_instance is None:
+        raise RuntimeError("Rate limiter not initialized. Call init_rate_limiter first.")
+    return _limiter_instance
@@ -0,0 +1,277 @@
+import asyncio
+import heapq
+import logging
+import random
+import statistics
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+from kernel.metrics import SCHEDULER_CYCLE_SECONDS
+
+# 连续未发现新条目时轮询间隔的增长倍数
+BACKOFF_FACTOR = 1.5
+# 估算发布间隔时参考的最近条目数量
+HISTORY_SIZE = 20
+
+
+class CycleStats(NamedTuple):
+    processed: int
+    failed: int
+    duration: float  # 秒
+
+
+class PollingEngine:
+    """
+    订阅轮询引擎
+
+    所有任务共享一个全局并发上限，同一域名的任务再受单域名并发上限约束，
+    同一个 key 的任务通过锁串行执行，保证单个订阅内的消息顺序。
+    """
+
+    def __init__(self, concurrency: int, per_host_concurrency: int):
+        self.concurrency = max(1, concurrency)
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self._global = asyncio.Semaphore(self.concurrency)
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._locks: Dict[Any, asyncio.Lock] = {}
+
+    def lock(self, key: Any) -> asyncio.Lock:
+        """
+        获取指定 key 的串行锁
+        """
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).hostname or ''
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return semaphore
+
+    async def submit(self, key: Any, url: str, job: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        在并发限制下执行单个任务
+
+        Args:
+            key: 串行 key，相同 key 的任务按提交顺序依次执行
+            url: 任务访问的 URL，用于单域名限流
+            job: 无参协程函数
+
+        Returns:
+            job 的返回值
+        """
+        async with self.lock(key):
+            async with self._global:
+                async with self._host_semaphore(url):
+                    return await job()
+
+    async def run_cycle(self, jobs: Iterable[Tuple[Any, str, Callable[[], Awaitable[Any]]]]) -> CycleStats:
+        """
+        并发执行一轮任务并统计耗时
+
+        Args:
+            jobs: (key, url, job) 列表
+
+        Returns:
+            CycleStats: 本轮处理数量、失败数量和耗时
+        """
+        start = time.monotonic()
+        jobs = list(jobs)
+        results = await asyncio.gather(
+            *(self.submit(key, url, job) for key, url, job in jobs),
+            return_exceptions=True
+        )
+        failed = 0
+        for (key, url, _), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logging.error(f"Polling job {key} ({url}) failed: {result}")
+        stats = CycleStats(processed=len(jobs), failed=failed, duration=time.monotonic() - start)
+        SCHEDULER_CYCLE_SECONDS.observe(stats.duration)
+        logging.info(
+            f"Polling cycle finished: {stats.processed} jobs, {stats.failed} failed, "
+            f"{stats.duration:.1f}s (concurrency={self.concurrency}, "
+            f"per_host={self.per_host_concurrency})"
+        )
+        return stats
+
+
+class ScheduleEntry(NamedTuple):
+    interval: float  # 秒
+    next_at: float  # UTC 时间戳
+    last_item_at: float  # 已知最新条目的 UTC 时间戳，0 表示未知
+
+
+def estimate_interval(pub_dates: Iterable[int], found_new: bool, previous: float,
+                      min_interval: float, max_interval: float) -> float:
+    """
+    根据条目发布时间估算下一次轮询间隔
+
+    有新条目时使用最近条目发布间隔的中位数，没有新条目时在此基础上逐步放大。
+
+    Args:
+        pub_dates: 本次抓取到的条目发布时间戳
+        found_new: 本次是否发现新条目
+        previous: 上一次的轮询间隔
+        min_interval: 间隔下限
+        max_interval: 间隔上限
+
+    Returns:
+        interval: 新的轮询间隔（秒）
+    """
+    dates = sorted({date for date in pub_dates if date > 0}, reverse=True)[:HISTORY_SIZE]
+    gaps = [newer - older for newer, older in zip(dates, dates[1:])]
+    learned = statistics.median(gaps) if gaps else previous
+    if found_new:
+        interval = learned
+    else:
+        interval = max(learned, previous * BACKOFF_FACTOR)
+    return min(max(interval, min_interval), max_interval)
+
+
+def entry_from_row(row: Dict[str, Any]) -> ScheduleEntry:
+    """
+    将 feed_schedule 表的记录转换为 ScheduleEntry
+    """
+    last_item_at = row.get('last_item_at')
+    return ScheduleEntry(
+        interval=row['interval_seconds'],
+        next_at=row['next_poll_at'].timestamp(),
+        last_item_at=last_item_at.timestamp() if last_item_at else 0,
+    )
+
+
+class FeedScheduler:
+    """
+    基于最小堆的 feed 轮询计划
+
+    每个 feed 有自己的下一次轮询时间，间隔根据发布频率和上次是否有新条目自适应调整。
+    堆中的过期记录采用惰性删除。
+    """
+
+    def __init__(self, default_interval: float, min_interval: float, max_interval: float,
+                 jitter: float = 0.0):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self._heap: List[Tuple[float, str]] = []
+        self._entries: Dict[str, ScheduleEntry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _push(self, feed_url: str, entry: ScheduleEntry):
+        self._entries[feed_url] = entry
+        heapq.heappush(self._heap, (entry.next_at, feed_url))
+
+    def load(self, rows: Iterable[Dict[str, Any]]):
+        """
+        从数据库记录恢复轮询计划
+        """
+        for row in rows:
+            self._push(row['feed_url'], entry_from_row(row))
+
+    def sync(self, feed_urls: Iterable[str], now: Optional[float] = None):
+        """
+        与当前订阅的 feed 同步：新 feed 立即到期，已无订阅的 feed 移除
+        """
+        now = time.time() if now is None else now
+        feed_urls = set(feed_urls)
+        for feed_url in list(self._entries):
+            if feed_url not in feed_urls:
+                del self._entries[feed_url]
+        for feed_url in feed_urls:
+            if feed_url not in self._entries:
+                self._push(feed_url, ScheduleEntry(self.default_interval, now, 0))
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """
+        取出所有已到期的 feed
+        """
+        now = time.time() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            next_at, feed_url = heapq.heappop(self._heap)
+            entry = self._entries.get(feed_url)
+            if entry is not None and entry.next_at == next_at:
+                due.append(feed_url)
+        return due
+
+    def next_due(self) -> Optional[float]:
+        """
+        最近一次到期时间，没有计划时返回 None
+        """
+        while self._heap:
+            next_at, feed_url = self._heap[0]
+            entry = self._entries.get(feed_url)
+            if entry is not None and entry.next_at == next_at:
+                return next_at
+            heapq.heappop(self._heap)
+        return None
+
+    def reschedule(self, feed_url: str, pub_dates: Iterable[int], has_items: bool,
+                   now: Optional[float] = None) -> ScheduleEntry:
+        """
+        根据本次抓取结果安排下一次轮询
+
+        Args:
+            feed_url: 订阅的 URL
+            pub_dates: 本次抓取到的条目发布时间戳
+            has_items: 本次是否抓取到（有变化的）条目
+            now: 当前时间戳
+
+        Returns:
+            entry: 新的轮询计划
+        """
+        now = time.time() if now is None else now
+        previous = self._entries.get(feed_url) or ScheduleEntry(self.default_interval, now, 0)
+        entry = self.plan(previous, pub_dates, has_items, now)
+        self._push(feed_url, entry)
+        return entry
+
+    def plan(self, previous: ScheduleEntry, pub_dates: Iterable[int], has_items: bool,
+             now: float) -> ScheduleEntry:
+        """
+        根据上一次的计划和本次抓取结果计算新的计划，不修改调度器状态
+        """
+        pub_dates = list(pub_dates)
+        newest = max(pub_dates, default=0)
+        # 没有发布时间的 feed 只能以内容有变化作为有新条目的依据
+        found_new = newest > previous.last_item_at if newest else has_items
+        interval = estimate_interval(pub_dates, found_new, previous.interval,
+                                     self.min_interval, self.max_interval)
+        delay = interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        return ScheduleEntry(
+            interval=interval,
+            next_at=now + delay,
+            last_item_at=max(newest, previous.last_item_at),
+        )
+
+
+# 单例模式，全局轮询引擎
+_engine_instance = None
+
+
+def init_engine(concurrency: int, per_host_concurrency: int) -> PollingEngine:
+    """
+    初始化轮询引擎
+    """
+    global _engine_instance
+    if _engine_instance is None:
+        _engine_instance = PollingEngine(concurrency, per_host_concurrency)
+    return _engine_instance
+
+
+def get_engine() -> PollingEngine:
+    """
+    获取轮询引擎实例
+    """
+    global _engine_instance
+    if _engine_instance is None:
+        raise RuntimeError("Polling engine not initialized. Call init_engine first.")
+    return _engine_instance
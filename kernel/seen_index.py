@@ -0,0 +1,141 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Sequence, Tuple
+
+from kernel.db_manager import get_db
+
+
+def item_hash(item) -> int:
+    """
+    计算条目的 64 位标识（有符号，可直接存入 BIGINT）
+
+    优先使用 guid，其次是 link，都没有时使用标题。
+    """
+    key = item.guid or item.link or item.title
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class SeenIndex:
+    """
+    已处理条目索引
+
+    数据库中的 seen_items 表是权威记录，前面加一层内存 LRU，
+    重复轮询同一 feed 时无需访问数据库。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._lru = OrderedDict()
+        # 已确认在 seen_items 中有记录的订阅
+        self._with_history = set()
+
+    def _remember(self, subscription_id: int, hashes: Iterable[int]):
+        for h in hashes:
+            key = (subscription_id, h)
+            self._lru[key] = None
+            self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def _cached(self, subscription_id: int, h: int) -> bool:
+        key = (subscription_id, h)
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            return True
+        return False
+
+    async def seen(self, subscription_id: int, hashes: Sequence[int]) -> set:
+        """
+        返回 hashes 中已处理过的部分
+        """
+        seen = {h for h in hashes if self._cached(subscription_id, h)}
+        unknown = [h for h in hashes if h not in seen]
+        if unknown:
+            found = await get_db().get_seen_hashes(subscription_id, unknown)
+            self._remember(subscription_id, found)
+            seen.update(found)
+        return seen
+
+    async def has_history(self, subscription_id: int) -> bool:
+        """
+        订阅是否有过已处理记录，没有记录的是升级前的旧订阅
+        """
+        if subscription_id in self._with_history:
+            return True
+        if await get_db().has_seen_items(subscription_id):
+            self._with_history.add(subscription_id)
+            return True
+        return False
+
+    async def select_new(self, subscription_id: int, items: Sequence, watermark: float) -> Tuple[List, List[int]]:
+        """
+        从条目中选出未处理过的新条目
+
+        订阅在 seen_items 中还没有任何记录（升级前的旧订阅）时，
+        发布时间不晚于 watermark 的条目视为已发送，不再推送。
+        本次的条目都未处理过但订阅已有其他记录时（例如 feed 整体换了一批条目），照常推送。
+
+        Args:
+            subscription_id: 订阅 ID
+            items: 归一化后的条目列表（NormalizedItem）
+            watermark: 订阅的 updated_at 时间戳
+
+        Returns:
+            (new_items, skipped): 新条目（保持原顺序）和应直接标记为已处理的条目标识
+        """
+        hashes = [item.item_id for item in items]
+        seen = await self.seen(subscription_id, hashes)
+        new_items = []
+        skipped = []
+        no_history = not seen and watermark > 0 and not await self.has_history(subscription_id)
+        # 旧版本用 time.mktime 把 UTC 时间当作本地时间计算 pubDate，换算回 UTC 再比较
+        legacy_watermark = watermark - time.timezone
+        for item, h in zip(items, hashes):
+            if h in seen:
+                continue
+            if no_history and item.pubDate <= legacy_watermark:
+                skipped.append(h)
+                continue
+            new_items.append(item)
+        return new_items, skipped
+
+    async def mark_seen(self, subscription_id: int, hashes: Sequence[int]):
+        """
+        批量标记条目为已处理
+        """
+        if not hashes:
+            return
+        try:
+            await get_db().add_seen_items(subscription_id, list(hashes))
+        except Exception as e:
+            logging.error(f"Error saving seen items for subscription {subscription_id}: {e}")
+            raise
+        self._remember(subscription_id, hashes)
+        self._with_history.add(subscription_id)
+
+
+# 单例模式，全局已处理条目索引
+_index_instance = None
+
+
+def init_seen_index(capacity: int) -> SeenIndex:
+    """
+    初始化已处理条目索引
+    """
+    global _index_instance
+    if _index_instance is None:
+        _index_instance = SeenIndex(capacity)
+    return _index_instance
+
+
+def get_seen_index() -> SeenIndex:
+    """
+    获取已处理条目索引实例
+    """
+    global _index_instance
+    if _index_instance is None:
+        raise RuntimeError("Seen index not initialized. Call init_seen_index first.")
+    return _index_instance
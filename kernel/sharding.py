@@ -0,0 +1,66 @@
+import bisect
+import hashlib
+from typing import Collection, Dict, Hashable, List, Optional
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    一致性哈希环
+
+    每个节点在环上放置 replicas 个虚拟节点。增删节点时，
+    只有落在该节点区间内的 key 会改变归属。
+    """
+
+    def __init__(self, nodes: Collection[Hashable] = (), replicas: int = 100):
+        self.replicas = replicas
+        self._ring: Dict[int, Hashable] = {}
+        self._points: List[int] = []
+        for node in nodes:
+            self.add(node)
+
+    def __contains__(self, node: Hashable) -> bool:
+        return node in self._ring.values()
+
+    def add(self, node: Hashable):
+        """
+        添加节点
+        """
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            if point not in self._ring:
+                self._ring[point] = node
+                bisect.insort(self._points, point)
+
+    def remove(self, node: Hashable):
+        """
+        移除节点
+        """
+        points = [point for point, owner in self._ring.items() if owner == node]
+        for point in points:
+            del self._ring[point]
+        self._points = sorted(self._ring)
+
+    def owner(self, key: str, candidates: Optional[Collection[Hashable]] = None) -> Optional[Hashable]:
+        """
+        查找 key 所属的节点
+
+        Args:
+            key: 要分配的 key
+            candidates: 可选的节点范围，从 key 的位置沿环查找第一个在范围内的节点
+
+        Returns:
+            node: 所属节点，没有可用节点时返回 None
+        """
+        if not self._points or (candidates is not None and not candidates):
+            return None
+        start = bisect.bisect(self._points, _hash(key))
+        count = len(self._points)
+        for i in range(count):
+            node = self._ring[self._points[(start + i) % count]]
+            if candidates is None or node in candidates:
+                return node
+        return None
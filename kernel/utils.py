@@ -2,6 +2,9 @@ from datetime import datetime
 import logging
 import re
 
+# 标题中的中文部分
+CHINESE_RE = re.compile(r'[\u4e00-\u9fa5]+')
+
 def pubdate_to_timestamp(pubdate_str: str) -> float:
     """
     将pubDate字符串转换为UTC时间戳
@@ -25,7 +28,7 @@ def pubdate_to_timestamp(pubdate_str: str) -> float:
 
 def generate_chinese_tags(title):
     # 使用正则表达式匹配所有的中文部分
-    chinese_parts = re.findall(r'[\u4e00-\u9fa5]+', title)
+    chinese_parts = CHINESE_RE.findall(title)
     # 为每个中文部分添加 # 符号
     tags = [f"#{part}" for part in chinese_parts]
     # 将标签用空格连接成字符串
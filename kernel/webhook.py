@@ -0,0 +1,102 @@
+import hashlib
+import hmac
+import logging
+from typing import Dict, Tuple
+
+from telegram import Update
+
+# Telegram 在每次推送中携带 setWebhook 时设置的 secret_token
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def webhook_secret(token: str) -> str:
+    """
+    由 bot token 派生的 webhook secret_token，重启后保持不变且不泄露 token
+    """
+    return hmac.new(token.encode('utf-8'), b'webhook', hashlib.sha256).hexdigest()
+
+
+class WebhookServer:
+    """
+    所有 bot 共用的 webhook 服务
+
+    Telegram 将 bot 的更新推送到 /webhook/<bot id>，校验 secret_token 后
+    放入对应 Application 的 update_queue，由 Application 按轮询模式相同的方式处理。
+    """
+
+    def __init__(self):
+        self._bots: Dict[int, Tuple[str, object]] = {}
+        self._runner = None
+
+    def register(self, application, secret: str):
+        """
+        注册 bot 的 Application 和 secret_token
+        """
+        self._bots[application.bot.id] = (secret, application)
+
+    async def _handle(self, request):
+        from aiohttp import web
+        try:
+            bot_id = int(request.match_info['bot_id'])
+        except ValueError:
+            raise web.HTTPNotFound()
+        registered = self._bots.get(bot_id)
+        if registered is None:
+            raise web.HTTPNotFound()
+        secret, application = registered
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), secret):
+            raise web.HTTPForbidden()
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except Exception as e:
+            logging.warning(f"Invalid webhook update for bot {bot_id}: {e}")
+            raise web.HTTPBadRequest()
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def start(self, host: str, port: int):
+        """
+        启动 HTTP 服务
+        """
+        if self._runner is None:
+            # 默认使用轮询，用到时才导入 aiohttp.web
+            from aiohttp import web
+            app = web.Application()
+            app.router.add_post('/webhook/{bot_id}', self._handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, host, port).start()
+            logging.info(f"Webhook server listening on {host}:{port}")
+
+    async def stop(self):
+        """
+        停止 HTTP 服务
+        """
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# 单例模式，全局 webhook 服务
+_server_instance = None
+
+
+async def start_webhook_server(host: str, port: int) -> WebhookServer:
+    """
+    启动 webhook 服务，多次调用时复用同一个服务
+    """
+    global _server_instance
+    if _server_instance is None:
+        _server_instance = WebhookServer()
+    await _server_instance.start(host, port)
+    return _server_instance
+
+
+async def stop_webhook_server():
+    """
+    停止 webhook 服务
+    """
+    global _server_instance
+    if _server_instance is not None:
+        await _server_instance.stop()
+        _server_instance = None
@@ -7,14 +7,23 @@ PID=$(ps aux | grep rss_bot.py | grep -v grep | awk '{print $2}')
 if [ -z "$PID" ]; then
     echo "没有找到正在运行的 rss_bot.py 进程"
 else
-    echo "找到进程 PID: $PID, 正在杀死..."
-    kill -9 $PID
+    echo "找到进程 PID: $PID, 正在停止..."
+    # 先发送 SIGTERM，让进程释放租约并写入缓冲的数据
+    kill $PID
+    for i in $(seq 1 15); do
+        if ! kill -0 $PID 2>/dev/null; then
+            break
+        fi
+        sleep 1
+    done
+    if kill -0 $PID 2>/dev/null; then
+        echo "进程未能正常退出，强制终止..."
+        kill -9 $PID
+        sleep 2
+    fi
     echo "进程已终止"
 fi
 
-# 等待一段时间，确保进程已经完全终止（可根据实际情况调整等待时间）
-sleep 2
-
 # 重新启动 rss_bot.py 并将输出重定向到日志文件
 nohup python3 rss_bot.py > /tmp/rss-bot.log 2>&1 &
 
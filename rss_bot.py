@@ -1,12 +1,38 @@
+import argparse
 import logging
 import os
 import asyncio
+import signal
 
-from business import telegram_bot, discord_bot
-from kernel.config import discord_config, telegram_config
+from kernel.config import discord_config, telegram_config, runtime_config, scheduler_config
+
+
+def _raise_interrupt(signum, frame):
+    # 收到 SIGTERM 时按 Ctrl-C 处理，以便释放租约、写入缓冲并关闭连接
+    raise KeyboardInterrupt
+
+
+def new_event_loop():
+    """
+    创建事件循环，USE_UVLOOP=true 且已安装 uvloop 时使用 uvloop
+    """
+    if runtime_config['uvloop']:
+        try:
+            import uvloop
+            return uvloop.new_event_loop()
+        except ImportError:
+            logging.warning("USE_UVLOOP is set but uvloop is not installed, using the default event loop")
+    return asyncio.new_event_loop()
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--worker', action='store_true',
+                        help='只轮询和发送订阅，不接收 bot 命令（需配合 POLL_MODE=lease 运行多个进程）')
+    args = parser.parse_args()
+    if args.worker and scheduler_config['mode'] != 'lease':
+        # 非租约模式下每个进程都会轮询全部订阅，多个 worker 会重复发送
+        parser.error("--worker requires POLL_MODE=lease")
 
     # Setup logging
     logging.basicConfig(
@@ -16,8 +42,9 @@ def main():
 
     # Setup and run Discor/Telegram bot
 
-    loop = asyncio.new_event_loop()
+    loop = new_event_loop()
     asyncio.set_event_loop(loop)
+    signal.signal(signal.SIGTERM, _raise_interrupt)
     # loop = asyncio.get_event_loop()
 
     tasks = []
@@ -26,15 +53,19 @@ def main():
     logging.info(f'discord token: {discord_token}')
     logging.info(f'telegram token: {telegram_token}')
 
-    if discord_token:
+    # 只导入已配置的子系统
+    if discord_token and not args.worker:
+        from business import discord_bot
         tasks.append(discord_bot.start_task())
 
+    telegram_bot = None
     if telegram_token:
+        from business import telegram_bot
         tasks.append(telegram_bot.init_task())
         tokens = telegram_token.split(",")
         if len(tokens) >= 1:
             for tel_token in tokens:
-                tasks.append(telegram_bot.start_task(tel_token))
+                tasks.append(telegram_bot.start_task(tel_token, args.worker))
         tasks.append(telegram_bot.scheduled_task())
 
     try:
@@ -43,7 +74,8 @@ def main():
         loop.run_forever()
     except KeyboardInterrupt:
         logging.info("Ctrl-C close!!")
-        telegram_bot.close_all()
+        if telegram_bot is not None:
+            telegram_bot.close_all()
     finally:
         loop.close()
 